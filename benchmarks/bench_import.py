@@ -0,0 +1,56 @@
+"""
+Times `import pycno` in fresh interpreters and checks that the JAX stack is not loaded.
+
+Usage:
+    python benchmarks/bench_import.py [--repeats 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SOURCE_DIRECTORY = Path(__file__).resolve().parents[1] / "src"
+
+# Modules that should only load when a JAX or DataFrame feature is used
+LAZY_MODULES = ["jax", "diffrax", "equinox", "sbmltoodejax", "pandas", "scipy.stats"]
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import pycno
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {LAZY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def time_import(repeats=5):
+    """
+    Imports pycno in new interpreters.
+
+    Args:
+        repeats (int): Number of interpreters
+
+    Returns:
+        dict with the median and minimum import time in seconds and the lazy modules loaded
+    """
+    seconds, loaded = [], set()
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", PROBE], capture_output=True, text=True, check=True,
+                                env={**os.environ, "PYTHONPATH": str(SOURCE_DIRECTORY)}).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        seconds.append(result["seconds"])
+        loaded.update(result["loaded"])
+    seconds.sort()
+    return {"median": seconds[len(seconds) // 2], "min": seconds[0], "repeats": repeats,
+            "eagerly_loaded": sorted(loaded)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    result = time_import(parser.parse_args().repeats)
+    print(json.dumps(result, indent=2))
+    if result["eagerly_loaded"]:
+        sys.exit(f"Modules loaded by import pycno: {', '.join(result['eagerly_loaded'])}")
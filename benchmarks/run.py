@@ -0,0 +1,237 @@
+"""
+Benchmarks of the shipped models, appended to a JSON lines history for comparison between commits.
+
+Each benchmark runs in a new interpreter, so its peak memory and first call
+(including model compilation) are measured from a clean process.
+
+Usage:
+    python benchmarks/run.py [--filter sweep] [--repeats 5] [--history path]
+    python benchmarks/run.py --compare [--base commit]
+    python benchmarks/run.py --list
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BENCHMARK_DIRECTORY = Path(__file__).resolve().parent
+SOURCE_DIRECTORY = BENCHMARK_DIRECTORY.parent / "src"
+DEFAULT_HISTORY = BENCHMARK_DIRECTORY / "results" / "history.jsonl"
+
+# Shipped models and the compartment doses are injected into
+MODELS = {"PSMA": "Vein", "reduced": "Blood"}
+
+# Minutes between dose cycles
+CYCLE_INTERVAL = 6 * 7 * 24 * 60
+
+# Ratio of medians above which compare reports a regression
+REGRESSION_THRESHOLD = 1.1
+
+
+def get_dose(model_name, cycles=1):
+    from pycno import Dose
+    compartment = MODELS[model_name]
+    return Dose(times=[i * CYCLE_INTERVAL for i in range(cycles)],
+                targets={f"{compartment}.Hot": [1.0] * cycles, f"{compartment}.Cold": [10.0] * cycles})
+
+
+def bench_simulate(model_name, steps, cycles):
+    from pycno import Model
+    model = Model(model_name)
+    dose = get_dose(model_name, cycles)
+    return lambda: model.simulate(dose, stop=cycles * CYCLE_INTERVAL, steps=steps,
+                                  disable_progress_bar=True, executor="serial")
+
+
+def bench_sweep(model_name, points):
+    import numpy as np
+    from pycno import Model
+    model = Model(model_name)
+    dose = get_dose(model_name)
+    values = np.linspace(0.5, 1.5, points)[:, None] * dict(model.get_parameters())["k_off"]
+    # Starts the worker pool and compiles the model in each worker
+    model.simulate(dose, swept_parameters=["k_off"], swept_values=values[:1], disable_progress_bar=True)
+    return lambda: model.simulate(dose, swept_parameters=["k_off"], swept_values=values,
+                                  disable_progress_bar=True)
+
+
+def bench_initialize_sbml_model(model_name):
+    from pycno import Model
+    model = Model(model_name)
+    return model.initialize_sbml_model
+
+
+def bench_convert_model_to_jax(model_name):
+    import libsbml
+    from pycno import Model
+    from pycno.utils.jax_conversion import convert_model_to_jax
+    sbml_string = libsbml.writeSBMLToString(Model(model_name).document)
+    return lambda: convert_model_to_jax(sbml_string, cache=None)
+
+
+def bench_compute_sensitivities(model_name):
+    from pycno import Model
+    model = Model(model_name)
+    dose = get_dose(model_name)
+    return lambda: model.compute_sensitivities(dose, [30.0, 60.0], ["Kidney", "Tumor1"])
+
+
+def bench_import():
+    from bench_import import time_import
+    return lambda: time_import(repeats=1)
+
+
+def get_benchmarks():
+    """Returns benchmark names mapped to a function and its arguments."""
+    benchmarks = {"import": (bench_import, ())}
+    for model_name in MODELS:
+        for steps in (100, 1000, 10000):
+            benchmarks[f"simulate[{model_name},steps={steps},cycles=1]"] = (bench_simulate, (model_name, steps, 1))
+        for cycles in (3, 6):
+            benchmarks[f"simulate[{model_name},steps=1000,cycles={cycles}]"] = (bench_simulate, (model_name, 1000, cycles))
+        for points in (10, 100, 1000):
+            benchmarks[f"sweep[{model_name},points={points}]"] = (bench_sweep, (model_name, points))
+        benchmarks[f"initialize_sbml_model[{model_name}]"] = (bench_initialize_sbml_model, (model_name,))
+        benchmarks[f"convert_model_to_jax[{model_name}]"] = (bench_convert_model_to_jax, (model_name,))
+        benchmarks[f"compute_sensitivities[{model_name}]"] = (bench_compute_sensitivities, (model_name,))
+    return benchmarks
+
+
+def get_peak_rss():
+    """Returns the peak resident memory of this process and of its finished children in MB."""
+    scale = 1 / 1024**2 if sys.platform == "darwin" else 1 / 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def run_child(name, repeats):
+    """Runs one benchmark in this process and returns its measurements."""
+    setup, args = get_benchmarks()[name]
+    start = time.perf_counter()
+    function = setup(*args)
+    setup_seconds = time.perf_counter() - start
+    setup_rss, _ = get_peak_rss()
+
+    start = time.perf_counter()
+    function()
+    first_seconds = time.perf_counter() - start
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    from pycno import shutdown_workers
+    shutdown_workers()
+    peak_rss, worker_peak_rss = get_peak_rss()
+    seconds.sort()
+    return {"setup": setup_seconds, "first": first_seconds,
+            "median": seconds[len(seconds) // 2] if seconds else first_seconds,
+            "min": seconds[0] if seconds else first_seconds, "repeats": repeats,
+            "setup_rss_mb": setup_rss, "peak_rss_mb": peak_rss, "worker_peak_rss_mb": worker_peak_rss}
+
+
+def run(names, repeats):
+    """Runs benchmarks in new interpreters, recording an error for those that fail."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([str(SOURCE_DIRECTORY), str(BENCHMARK_DIRECTORY)])}
+    results = {}
+    for name in names:
+        # Large sweeps are timed once
+        n_repeats = 1 if name.startswith("sweep") and "points=1000" in name else repeats
+        process = subprocess.run([sys.executable, __file__, "--child", name, "--repeats", str(n_repeats)],
+                                 capture_output=True, text=True, env=env)
+        lines = process.stdout.strip().splitlines()
+        if process.returncode == 0 and lines:
+            results[name] = json.loads(lines[-1])
+        else:
+            error = process.stderr.strip().splitlines()
+            results[name] = {"error": error[-1] if error else f"exit code {process.returncode}"}
+        result = results[name]
+        print(f"{name:50s} " + (f"{result['median']:10.4f} s {result['peak_rss_mb']:8.1f} MB"
+                                 if "error" not in result else result["error"]), flush=True)
+    return results
+
+
+def get_commit():
+    """Returns the current commit and whether the working tree has changes."""
+    def git(*args):
+        return subprocess.run(["git", *args], capture_output=True, text=True,
+                              cwd=BENCHMARK_DIRECTORY).stdout.strip()
+    return git("rev-parse", "HEAD") or None, bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def get_machine():
+    import numpy
+    import roadrunner
+    return {"node": platform.node(), "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(), "system": platform.system(), "python": platform.python_version(),
+            "numpy": numpy.__version__, "roadrunner": roadrunner.__version__}
+
+
+def append_history(path, results):
+    commit, dirty = get_commit()
+    entry = {"commit": commit, "dirty": dirty,
+             "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+             "machine": get_machine(), "results": results}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def compare(path, base=None):
+    """
+    Prints the ratio of the latest median times to those of an earlier run on the same machine.
+
+    Args:
+        path (Path): History file
+        base (str): Commit, or commit prefix, to compare against, defaults to the previous run
+    """
+    with open(path) as f:
+        history = [json.loads(line) for line in f if line.strip()]
+    if not history:
+        sys.exit(f"No benchmark runs in {path}.")
+    latest = history[-1]
+    candidates = [entry for entry in history[:-1] if entry["machine"] == latest["machine"]
+                  and (base is None or (entry["commit"] or "").startswith(base))]
+    if not candidates:
+        sys.exit("No earlier run on this machine to compare against.")
+    reference = candidates[-1]
+
+    print(f"{(reference['commit'] or '')[:10]} -> {(latest['commit'] or '')[:10]}"
+          f"{' (dirty)' if latest['dirty'] else ''}")
+    for name, result in latest["results"].items():
+        previous = reference["results"].get(name)
+        if previous is None or "error" in previous or "error" in result:
+            continue
+        ratio = result["median"] / previous["median"]
+        flag = "slower" if ratio > REGRESSION_THRESHOLD else "faster" if ratio < 1 / REGRESSION_THRESHOLD else ""
+        print(f"{name:50s} {previous['median']:10.4f} {result['median']:10.4f} {ratio:6.2f}x "
+              f"{result['peak_rss_mb'] - previous['peak_rss_mb']:+8.1f} MB {flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filter", default="", help="Run benchmarks whose name contains this string")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--history", type=Path, default=DEFAULT_HISTORY)
+    parser.add_argument("--compare", action="store_true", help="Compare the latest run to an earlier one")
+    parser.add_argument("--base", help="Commit to compare against")
+    parser.add_argument("--list", action="store_true")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.repeats)))
+    elif args.compare:
+        compare(args.history, args.base)
+    elif args.list:
+        print("\n".join(get_benchmarks()))
+    else:
+        names = [name for name in get_benchmarks() if args.filter in name]
+        append_history(args.history, run(names, args.repeats))
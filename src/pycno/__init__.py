@@ -16,5 +16,7 @@ if conda_prefix:
             print(f"Warning: failed to preload libpython: {e}")
 
 from .modeling.functions import Model, Dose
+from .modeling.cohort import Cohort
+from .modeling.executors import shutdown_workers
 
-__all__ = ["Model", "Dose"]
+__all__ = ["Model", "Dose", "Cohort", "shutdown_workers"]
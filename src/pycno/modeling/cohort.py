@@ -0,0 +1,194 @@
+import hashlib
+
+import numpy as np
+
+# Patients per block of random numbers, so any patient can be regenerated alone
+_BLOCK_SIZE = 4096
+
+# Rounds of the Feistel network permuting Latin hypercube strata
+_FEISTEL_ROUNDS = 6
+
+# Probabilities at which distributions other than frozen scipy distributions are fingerprinted
+_FINGERPRINT_PROBABILITIES = np.linspace(0.005, 0.995, 25)
+
+# Changes whenever the same cohort definition samples different patients
+_SAMPLING_VERSION = 2
+
+
+class Cohort():
+    """
+    Virtual patient cohort sampled from marginal distributions.
+
+    Patients are generated on demand by index, so a cohort can be passed as
+    swept_values without materializing every sample.
+
+    Args:
+        distributions (dict): Swept name (parameter, compartment or dose target)
+            to a distribution with a ppf method, e.g. scipy.stats.lognorm(0.2, scale=57)
+        n_patients (int): Number of patients
+        correlation (np.ndarray): Correlation matrix of the normal scores of the
+            distributions (Gaussian copula), or None for independent sampling
+        method (str): "lhs" for Latin hypercube, "sobol" for scrambled Sobol or "random"
+        seed (int): Random seed
+
+    The copula transforms the stratified samples of each patient, so with a
+    correlation only the first distribution keeps the Latin hypercube or
+    Sobol strata, and the others are plain correlated samples. Reordering
+    ranks to the correlation (Iman-Conover) would need every patient at once.
+    """
+    def __init__(self, distributions, n_patients, correlation=None, method="lhs", seed=None):
+        if method not in ("lhs", "sobol", "random"):
+            raise ValueError(f"Unknown sampling method {method}.")
+        self.distributions = dict(distributions)
+        self.names = list(self.distributions)
+        self.n_patients = int(n_patients)
+        self.method = method
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+
+        self.correlation = None
+        self.cholesky = None
+        if correlation is not None:
+            self.correlation = np.asarray(correlation, dtype=float)
+            if self.correlation.shape != (len(self.names), len(self.names)):
+                raise ValueError("correlation must be a square matrix with one row per distribution.")
+            self.cholesky = np.linalg.cholesky(self.correlation)
+
+
+    def __len__(self):
+        return self.n_patients
+
+    def __getitem__(self, indices):
+        """
+        Returns sampled values [n, n_distributions] of the patients at indices.
+        """
+        from scipy.special import ndtr, ndtri
+        indices = self.get_indices(indices)
+        if indices.ndim == 0:
+            return self[indices[None]][0]
+        u = self.get_uniform(indices)
+        if self.cholesky is not None:
+            u = ndtr(ndtri(u) @ self.cholesky.T)
+        return np.column_stack([distribution.ppf(u[:, j])
+                                for j, distribution in enumerate(self.distributions.values())])
+
+    def get_indices(self, indices):
+        """Returns patient indices selected by an index, slice, index array or boolean mask."""
+        if isinstance(indices, slice):
+            return np.arange(*indices.indices(self.n_patients))
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            return np.arange(self.n_patients)[indices]
+        if np.any((indices < -self.n_patients) | (indices >= self.n_patients)):
+            raise IndexError(f"Patient index out of range for a cohort of {self.n_patients} patients.")
+        return np.where(indices < 0, indices + self.n_patients, indices)
+
+    def get_uniform(self, indices):
+        """
+        Returns the stratified uniform samples [n, n_distributions] of the patients at indices.
+
+        Sobol points are drawn for each run of consecutive indices, skipping
+        the points between runs, which costs a cheap step per skipped point
+        but no memory.
+        """
+        n_dims = len(self.names)
+        if self.method == "sobol":
+            from scipy.stats import qmc
+            engine = qmc.Sobol(n_dims, scramble=True, seed=self.seed)
+            unique, inverse = np.unique(indices, return_inverse=True)
+            points = []
+            for run in np.split(unique, np.flatnonzero(np.diff(unique) > 1) + 1):
+                if run[0] > engine.num_generated:
+                    engine.fast_forward(int(run[0]) - engine.num_generated)
+                points.append(engine.random(len(run)))
+            return np.concatenate(points)[inverse.ravel()]
+
+        u = np.empty((len(indices), n_dims))
+        blocks = indices // _BLOCK_SIZE
+        for block in np.unique(blocks):
+            selected = blocks == block
+            rng = np.random.default_rng([self.seed, 1, int(block)])
+            u[selected] = rng.random((_BLOCK_SIZE, n_dims))[indices[selected] % _BLOCK_SIZE]
+        if self.method == "lhs":
+            strata = np.column_stack([permute(indices, self.n_patients, [self.seed, 0, j]) for j in range(n_dims)])
+            u = (strata + u) / self.n_patients
+        return u
+
+    def iter_chunks(self, chunksize=_BLOCK_SIZE):
+        """
+        Yields (indices, values) of consecutive chunks of patients.
+
+        Args:
+            chunksize (int): Patients per chunk
+        """
+        for start in range(0, self.n_patients, chunksize):
+            indices = np.arange(start, min(start + chunksize, self.n_patients))
+            yield indices, self[indices]
+
+    def to_frame(self, indices=slice(None)):
+        """
+        Returns sampled values of patients as a DataFrame indexed by patient.
+
+        Args:
+            indices: Patients to return, defaults to all
+        """
+        import pandas as pd
+        patients = self.get_indices(indices)
+        return pd.DataFrame(self[patients], index=pd.Index(patients, name="patient"), columns=self.names)
+
+    def fingerprint(self):
+        """
+        Returns a hash identifying the sampled cohort, stable across sessions.
+
+        Frozen scipy distributions are identified by their name and
+        arguments. Other distributions are identified, as the sampler sees
+        them, by their ppf at fixed probabilities.
+        """
+        digest = hashlib.sha256()
+        for name, distribution in self.distributions.items():
+            frozen = getattr(distribution, "dist", None)
+            if frozen is not None:
+                description = (getattr(frozen, "name", None), getattr(distribution, "args", None),
+                               getattr(distribution, "kwds", None))
+            else:
+                description = np.asarray(distribution.ppf(_FINGERPRINT_PROBABILITIES), dtype=float).tolist()
+            digest.update(repr((name, description)).encode())
+        digest.update(repr((self.n_patients, self.method, self.seed, _SAMPLING_VERSION)).encode())
+        if self.correlation is not None:
+            digest.update(self.correlation.tobytes())
+        return digest.hexdigest()
+
+
+def permute(indices, n, key):
+    """
+    Returns the images of indices under a pseudo-random permutation of range(n).
+
+    A balanced Feistel network over the smallest power of four covering n is
+    applied until the image falls in range(n) (cycle walking), so any index
+    is permuted without building the permutation.
+
+    Args:
+        indices (np.ndarray): Indices in range(n)
+        n (int): Size of the permuted range
+        key: Seed of the permutation
+    """
+    half_bits = max(1, (int(n - 1).bit_length() + 1) // 2)
+    mask = np.uint64((1 << half_bits) - 1)
+    shift = np.uint64(half_bits)
+    round_keys = np.random.default_rng(key).integers(0, 2**63, size=_FEISTEL_ROUNDS, dtype=np.uint64)
+
+    def feistel(x):
+        left, right = x >> shift, x & mask
+        for round_key in round_keys:
+            mixed = (right + round_key) * np.uint64(0x9E3779B97F4A7C15)
+            mixed ^= mixed >> np.uint64(29)
+            mixed *= np.uint64(0xBF58476D1CE4E5B9)
+            mixed ^= mixed >> np.uint64(32)
+            left, right = right, left ^ (mixed & mask)
+        return (left << shift) | right
+
+    x = feistel(np.asarray(indices, dtype=np.uint64))
+    outside = x >= n
+    while outside.any():
+        x[outside] = feistel(x[outside])
+        outside = x >= n
+    return x.astype(np.int64)
@@ -0,0 +1,133 @@
+import atexit
+import hashlib
+import multiprocessing as mp
+import os
+import pickle
+import shutil
+import tempfile
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+# Persistent pools, kept alive across simulate calls so workers reuse compiled models
+_pools = {}
+
+# Shared inputs loaded in this process, keyed by content hash
+_shared_inputs = {}
+_MAX_SHARED_INPUTS = 8
+_shared_directory = None
+
+
+class SerialExecutor(Executor):
+    """Executor running each task in the calling thread when it is submitted."""
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as error:
+            future.set_exception(error)
+        return future
+
+
+def get_executor(executor="process", max_workers=None):
+    """
+    Resolves an executor choice.
+
+    Args:
+        executor: "serial", "thread", "process" for the persistent pools, or a
+            concurrent.futures.Executor such as a Dask client's get_executor()
+        max_workers (int): Number of workers of the persistent pools, defaults
+            to cpu count. Also used as the number of workers of a given Executor
+            when it does not report one.
+
+    Returns:
+        (executor, n_workers, in_process) where in_process is True when tasks
+        share memory with the caller.
+    """
+    if isinstance(executor, Executor):
+        n_workers = max_workers or getattr(executor, "_max_workers", None) or os.cpu_count()
+        return executor, n_workers, isinstance(executor, (SerialExecutor, ThreadPoolExecutor))
+    if executor == "serial":
+        return SerialExecutor(), 1, True
+    if executor not in ("thread", "process"):
+        raise ValueError(f"Unknown executor {executor}.")
+
+    max_workers = max_workers or os.cpu_count()
+    pool = _pools.get(executor)
+    if pool is None or pool._max_workers != max_workers:
+        shutdown_workers(executor)
+        if executor == "thread":
+            pool = ThreadPoolExecutor(max_workers=max_workers)
+        else:
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp.get_context("spawn"))
+        _pools[executor] = pool
+    return pool, max_workers, executor == "thread"
+
+
+def shutdown_workers(executor=None):
+    """
+    Shuts down the persistent worker pools and their compiled models.
+
+    Args:
+        executor (str): "thread" or "process" to shut down one pool, or None for both
+    """
+    for name in [executor] if executor else list(_pools):
+        pool = _pools.pop(name, None)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+class SharedInput():
+    """
+    Handle to an object written to disk once and loaded once per worker process.
+
+    Pickling the handle only sends its path, so large inputs shared by every
+    task are not resent with each task. Workers must share the filesystem of
+    the caller, as with process pools and local clusters.
+
+    Only the _MAX_SHARED_INPUTS most recently created inputs are kept, and
+    the files of older ones are removed, so handles must not outlive the
+    creation of that many newer inputs.
+
+    Args:
+        obj: Picklable object
+    """
+    def __init__(self, obj):
+        data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        self.key = hashlib.sha256(data).hexdigest()
+        self.path = get_shared_directory() / f"{self.key}.pkl"
+        _shared_inputs.pop(self.key, None)
+        while len(_shared_inputs) >= _MAX_SHARED_INPUTS:
+            evicted = next(iter(_shared_inputs))
+            del _shared_inputs[evicted]
+            (self.path.parent / f"{evicted}.pkl").unlink(missing_ok=True)
+        if not self.path.exists():
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        _shared_inputs[self.key] = obj
+
+    def get(self):
+        """Returns the shared object, loading it on first use in this process."""
+        obj = _shared_inputs.pop(self.key, None)
+        if obj is None:
+            if len(_shared_inputs) >= _MAX_SHARED_INPUTS:
+                _shared_inputs.pop(next(iter(_shared_inputs)))
+            with open(self.path, "rb") as f:
+                obj = pickle.load(f)
+        _shared_inputs[self.key] = obj
+        return obj
+
+    def __getstate__(self):
+        return {"key": self.key, "path": self.path}
+
+
+def get_shared_directory():
+    global _shared_directory
+    if _shared_directory is None:
+        _shared_directory = Path(tempfile.mkdtemp(prefix="pycno-shared-"))
+        atexit.register(shutil.rmtree, _shared_directory, True)
+    return _shared_directory
+
+
+atexit.register(shutdown_workers)
@@ -0,0 +1,132 @@
+from dataclasses import dataclass
+
+import diffrax
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+
+from pycno.modeling.jax_backend import rollout_schedule
+
+# Levenberg-Marquardt damping at the first iteration
+INITIAL_DAMPING = 1e-3
+
+
+@dataclass
+class FitResult():
+    """
+    Fitted parameters of a batch of patients.
+
+    Args:
+        parameters (list): Fitted parameter names
+        times (np.ndarray): Measurement times
+        values (np.ndarray): Fitted values [n_patients, n_p]
+        standard_errors (np.ndarray): Standard errors of the fitted values [n_patients, n_p],
+            inf for parameters the data and prior do not depend on
+        cost (np.ndarray): Final weighted sum of squares, including the prior, halved [n_patients]
+        TACs (np.ndarray): Fitted TACs [n_patients, n_t, n_regions] in MBq
+    """
+    parameters: list
+    times: np.ndarray
+    values: np.ndarray
+    standard_errors: np.ndarray
+    cost: np.ndarray
+    TACs: np.ndarray
+
+
+def to_bounded(theta, lower, upper):
+    """
+    Maps unbounded values to the interval between lower and upper.
+
+    Values bounded on both sides use a logistic transform, on one side an
+    exponential transform, and unbounded values are left unchanged.
+    """
+    has_lower, has_upper = jnp.isfinite(lower), jnp.isfinite(upper)
+    lower = jnp.where(has_lower, lower, 0.0)
+    upper = jnp.where(has_upper, upper, 0.0)
+    return jnp.where(has_lower & has_upper, lower + (upper - lower) * jax.nn.sigmoid(theta),
+                     jnp.where(has_lower, lower + jnp.exp(theta),
+                               jnp.where(has_upper, upper - jnp.exp(theta), theta)))
+
+
+def to_unbounded(values, lower, upper):
+    """Inverse of to_bounded."""
+    values, lower, upper = (np.asarray(array, dtype=float) for array in (values, lower, upper))
+    has_lower, has_upper = np.isfinite(lower), np.isfinite(upper)
+    if np.any(has_lower & (values <= lower)) or np.any(has_upper & (values >= upper)):
+        raise ValueError("Initial values must lie strictly within their bounds.")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = (values - lower) / (upper - lower)
+        return np.where(has_lower & has_upper, np.log(fraction / (1 - fraction)),
+                        np.where(has_lower, np.log(values - lower),
+                                 np.where(has_upper, np.log(upper - values), values)))
+
+
+@eqx.filter_jit
+def fit_batch(rollout, y0, c0, c_indices, initialize, dose_indices, dose_amounts, segments, y_masks, nmol2mbq,
+              stepsize_controller, max_steps, data, weights, lower, upper, prior_mean, prior_weight,
+              theta0, max_iterations, forward):
+    """
+    Fits constants of a batch of patients by Levenberg-Marquardt, vectorized over patients.
+
+    Args:
+        initialize (InitialAssignments): Initial assignments depending on the fitted constants
+        dose_amounts (jnp.ndarray): Dose amounts [n_patients, n_targets, n_cycles]
+        data (jnp.ndarray): Measured TACs [n_patients, n_t, n_regions]
+        weights (jnp.ndarray): Inverse measurement standard deviations, 0 where missing
+        lower, upper (jnp.ndarray): Bounds [n_p]
+        prior_mean, prior_weight (jnp.ndarray): Gaussian prior means and inverse standard deviations [n_p]
+        theta0 (jnp.ndarray): Unbounded initial values [n_patients, n_p]
+        max_iterations (int): Number of Levenberg-Marquardt iterations
+        forward (bool): Use forward mode for the Jacobian
+
+    Returns:
+        (values, standard_errors, cost, TACs) with a leading n_patients axis
+    """
+    adjoint = diffrax.ForwardMode() if forward else None
+    jacobian = jax.jacfwd if forward else jax.jacrev
+
+    def predict(theta, amounts):
+        values = to_bounded(theta, lower, upper)
+        y, c = initialize(y0, c0.at[c_indices].set(values))
+        ys, _, _ = rollout_schedule(rollout, y, c, dose_indices, amounts,
+                                    segments, stepsize_controller, max_steps, adjoint)
+        return (y_masks @ ys).T * nmol2mbq, values
+
+    def single(theta0, amounts, data, weights):
+        data = jnp.where(weights > 0, data, 0.0)
+
+        def residuals(theta):
+            TAC, values = predict(theta, amounts)
+            r = jnp.concatenate([((TAC - data) * weights).ravel(), (values - prior_mean) * prior_weight])
+            return r, r
+
+        def cost_of(theta):
+            r, _ = residuals(theta)
+            cost = 0.5 * jnp.sum(r**2)
+            return jnp.where(jnp.isfinite(cost), cost, jnp.inf)
+
+        def step(_, state):
+            theta, damping, cost = state
+            J, r = jacobian(residuals, has_aux=True)(theta)
+            H = J.T @ J
+            delta = jnp.linalg.solve(H + damping * jnp.diag(jnp.diag(H)) + 1e-12 * jnp.eye(len(theta)), -J.T @ r)
+            new_cost = cost_of(theta + delta)
+            better = new_cost < cost
+            return (jnp.where(better, theta + delta, theta),
+                    jnp.where(better, damping / 3, damping * 2),
+                    jnp.where(better, new_cost, cost))
+
+        theta, _, cost = jax.lax.fori_loop(0, max_iterations, step,
+                                           (theta0, jnp.asarray(INITIAL_DAMPING, theta0.dtype), cost_of(theta0)))
+
+        J, _ = jacobian(residuals, has_aux=True)(theta)
+        covariance = jnp.linalg.pinv(J.T @ J)
+        scale = jnp.abs(jax.vmap(jax.grad(to_bounded))(theta, lower, upper))
+        TAC, values = predict(theta, amounts)
+        # Parameters the residuals do not depend on are not estimated at all
+        informed = jnp.any(J[:len(J) - len(theta)] != 0, axis=0) | (prior_weight > 0)
+        standard_errors = jnp.where(informed, scale * jnp.sqrt(jnp.abs(jnp.diag(covariance))), jnp.inf)
+        return values, standard_errors, cost, TAC
+
+    return jax.vmap(single)(theta0, dose_amounts, data, weights)
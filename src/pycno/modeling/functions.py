@@ -1,32 +1,30 @@
-from tqdm.contrib.concurrent import process_map
 import libsbml
 import numpy as np
-import roadrunner
 from pathlib import Path
+import hashlib
 import os
-import pickle
-from scipy import sparse
-import multiprocessing as mp
-mp.set_start_method("spawn", force=True)
-import diffrax
-import equinox as eqx
-import inspect
-import jax
-import jax.numpy as jnp
-import pandas as pd
-from pycno.utils.jax_conversion import convert_model_to_jax
+import time
+from pycno.modeling.sweep import SweepTarget, take_points
+from pycno.modeling.roadrunner_backend import SimulationSpec, iter_sweep
+from pycno.modeling.identifiability import FisherInformation, get_design_weights
+from pycno.modeling.profiling import get_finite_profiles, get_profile, record_jax_compilation, timed
+from pycno.modeling.results import SimulationResult
+from pycno.utils.cache import get_default_cache, get_result_cache
+from pycno.utils.storage import SweepStore
+from tqdm import tqdm
 from dataclasses import dataclass
 
 # TODO: Compartment units
 # TODO: Warning for parameters altered at runtime
 # TODO: Error for non found observables
 # TODO: Add docstrings
-# TODO: Add cold species return
-# TODO: Add all possible inputs for sweep
-# TODO: Update watched attrs
 # TODO: Dose error exceptions
-# TODO: Fix FIM
-# TODO: Add multidosing to jax
+
+# jax, diffrax and pandas are imported by the methods that use them, so that
+# roadrunner simulations and their worker processes start without them
+
+# Points per chunk written to disk when streaming sweep results
+STREAM_CHUNKSIZE = 64
 
 class ModelError(Exception):
     pass
@@ -35,24 +33,77 @@ class SimulationError(Exception):
 class DoseError(Exception):
     pass
 
+class ModelIndex():
+    """
+    Name and id lookups for an SBML model, built once when the model loads.
+
+    Args:
+        sbml_model (libsbml.Model): SBML model
+    """
+    def __init__(self, sbml_model):
+        self.parameter_ids = {}
+        self.parameter_values = {}
+        for parameter in sbml_model.getListOfParameters():
+            self.parameter_ids.setdefault(parameter.getName(), parameter.getId())
+            self.parameter_values[parameter.getId()] = parameter.getValue()
+
+        self.compartment_ids = {}
+        self.compartment_sizes = {}
+        self.compartments = []
+        self.subcompartments = {}
+        for compartment in sbml_model.getListOfCompartments():
+            self.compartment_ids.setdefault(compartment.getName(), compartment.getId())
+            self.compartment_sizes[compartment.getId()] = compartment.getSize()
+            self.compartments.append((compartment.getName(), compartment.getOutside()))
+            if compartment.getOutside():
+                self.subcompartments.setdefault(compartment.getOutside(), []).append(compartment.getId())
+
+        self.species = {}
+        for species in sbml_model.getListOfSpecies():
+            self.species.setdefault(species.getCompartment(), []).append((species.getId(), species.getName()))
+
+        self.assigned_ids = [assignment.getSymbol() for assignment in sbml_model.getListOfInitialAssignments()]
+
+    def get_species_id(self, compartment_name, species_name):
+        """Returns the id of a species in a compartment, or None if not found."""
+        compartment_id = self.compartment_ids.get(compartment_name)
+        for species_id, name in self.species.get(compartment_id, []):
+            if name == species_name:
+                return species_id
+        return None
+
+    def get_region_species(self, compartment_name, species_name=None):
+        """
+        Returns ids of species in a compartment and its subcompartments.
+
+        Args:
+            compartment_name (str): Compartment name
+            species_name (str): Only return species whose name contains this
+        """
+        compartment_id = self.compartment_ids.get(compartment_name)
+        if compartment_id is None:
+            return []
+        ids = []
+        for comp_id in self.subcompartments.get(compartment_id, []) + [compartment_id]:
+            for species_id, name in self.species.get(comp_id, []):
+                if species_name is None or species_name in name:
+                    ids.append(species_id)
+        return ids
+
 @dataclass
 class Dose():
     times: list
     targets: dict
-    def set_ids(self, sbml_model):
+    def set_ids(self, sbml_model, index=None):
+        index = index or ModelIndex(sbml_model)
         self.ids = []
         for species_name in list(self.targets.keys()):
-            for compartment in sbml_model.getListOfCompartments():
-                if compartment.getName() == species_name.split('.')[0]:
-                    break
-                else: compartment = None
-            if compartment == None:
-                comp = species_name.split('.')[0]
+            comp = species_name.split('.')[0]
+            if comp not in index.compartment_ids:
                 raise DoseError(f'{comp} compartment not found in model. Change dose target.')
-            for species in sbml_model.getListOfSpecies():
-                if species.getCompartment() == compartment.getId() and species.getName() == species_name.split('.')[1]:
-                    self.ids.append(species.getId())
-                    break
+            species_id = index.get_species_id(comp, species_name.split('.')[1])
+            if species_id is not None:
+                self.ids.append(species_id)
 
 class Model():
     """
@@ -62,11 +113,16 @@ class Model():
         model_name (str): Name of model in PyCNO or path to SBML file
         parameters (dict): Parameter input values
         compartment_volumes (dict): Compartment volumes in L
-        hotamount (float): Hot ligand amount in nmol
-        coldamount (float): Cold ligand amount in nmol
+
+    Assigning model_name reloads the SBML file. Assigning parameters or
+    compartment_volumes only applies the values that changed.
+
+    A value given for a parameter or compartment defined by an initial
+    assignment replaces the assignment on every backend, as swept values do,
+    and the assignment is removed from the document written by save_sbml.
+    Elements depending on a given value are evaluated again from it.
     """
-    _watched_attrs = {"model_name", "hotamount",
-                      "coldamount", "parameters", "compartment_volumes"}
+    _watched_attrs = {"model_name", "parameters", "compartment_volumes"}
 
     def __init__(self,
                  model_name,
@@ -81,6 +137,7 @@ class Model():
 
         self.sbml_model = None
         self.document = None
+        self.profile = None
 
         self._initializing = False
         self.initialize_sbml_model()
@@ -89,20 +146,26 @@ class Model():
         super().__setattr__(name, value)
         if getattr(self, "_initializing", False):
             return
-        if name in getattr(self, "_watched_attrs", set()):
+        if name == "model_name":
             self.initialize_sbml_model()
+        elif name in getattr(self, "_watched_attrs", set()):
+            self.update_sbml_model()
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        for key, value in list(state.items()):
-            try:
-                pickle.dumps(value)
-            except (TypeError, pickle.PicklingError):
-                del state[key]
+        state.pop("sbml_model", None)
+        state.pop("document", None)
+        state["profile"] = None
         return state
 
     def __setstate__(self, state):
         self.__dict__.update(state)
+        document = libsbml.readSBMLFromString(self.template_string)
+        self.__dict__["document"] = document
+        self.__dict__["sbml_model"] = document.getModel()
+        set_parameter_values(self.sbml_model, self.applied_parameters, self.index)
+        set_compartment_sizes(self.sbml_model, self.applied_volumes, self.index)
+        set_initial_assignments(self.sbml_model, self.get_overrides(), self.template_string, self.template_index)
 
     def initialize_sbml_model(self):
         if os.path.exists(self.model_name):
@@ -119,18 +182,56 @@ class Model():
         document = reader.readSBML(model_path)
         sbml_model = document.getModel()
 
-        if self.parameters:
-            set_parameter_values(sbml_model, self.parameters)
-
-        if self.compartment_volumes:
-            set_compartment_sizes(sbml_model, self.compartment_volumes)
-
         self.sbml_model = sbml_model
         self.document = document
+        self.template_string = libsbml.writeSBMLToString(document)
+        self.template_key = hashlib.sha256(self.template_string.encode()).hexdigest()
+        self.template_index = ModelIndex(sbml_model)
+        self.index = ModelIndex(sbml_model)
+        self.applied_parameters = {}
+        self.applied_volumes = {}
+
+        self.update_sbml_model()
+
+    def update_sbml_model(self):
+        """
+        Applies changes of parameters and compartment_volumes to the loaded model.
 
-        self.NMOL2MBQ = get_parameter(self.sbml_model, 'lambdaPhys') / \
+        Only values that differ from those already applied are set, and values
+        no longer given are restored from the SBML file.
+        """
+        parameters = dict(self.parameters or {})
+        restored = {name: self.template_index.parameter_values[self.index.parameter_ids[name]]
+                    for name in self.applied_parameters.keys() - parameters.keys()}
+        changed = {name: value for name, value in parameters.items()
+                   if self.applied_parameters.get(name) != value}
+        set_parameter_values(self.sbml_model, {**restored, **changed}, self.index)
+        self.applied_parameters = {name: value for name, value in parameters.items()
+                                   if name in self.index.parameter_ids}
+
+        volumes = dict(self.compartment_volumes or {})
+        restored = {name: self.template_index.compartment_sizes[self.index.compartment_ids[name]]
+                    for name in self.applied_volumes.keys() - volumes.keys()}
+        changed = {name: value for name, value in volumes.items()
+                   if self.applied_volumes.get(name) != value}
+        set_compartment_sizes(self.sbml_model, {**restored, **changed}, self.index)
+        self.applied_volumes = {name: value for name, value in volumes.items()
+                                if name in self.index.compartment_ids}
+        set_initial_assignments(self.sbml_model, self.get_overrides(), self.template_string, self.template_index)
+
+        self.NMOL2MBQ = get_parameter(self.sbml_model, 'lambdaPhys', self.index) / \
         60 * 6.022e23 / 10**9 / 10**6
 
+    def get_overrides(self):
+        """
+        Returns ids and values of parameters and compartments changed from the SBML file.
+        """
+        overrides = {self.index.parameter_ids[name]: float(value)
+                     for name, value in self.applied_parameters.items()}
+        overrides.update({self.index.compartment_ids[name]: float(value)
+                          for name, value in self.applied_volumes.items()})
+        return overrides
+
     def simulate(self,
                  dose: Dose,
                  stop: int = 60,
@@ -142,7 +243,17 @@ class Model():
                  swept_parameters: list = None,
                  swept_values: list = None,
                  disable_progress_bar: bool = False,
-                 maximum_integrator_steps: int = 20000
+                 maximum_integrator_steps: int = 20000,
+                 backend: str = "roadrunner",
+                 output_path: str = None,
+                 times: list = None,
+                 executor="process",
+                 max_workers: int = None,
+                 profile=None,
+                 nan_on_failure: bool = False,
+                 return_cold: bool = False,
+                 dtype=np.float64,
+                 as_result: bool = False
                  ):
         """
         Simulates SBML model.
@@ -156,15 +267,50 @@ class Model():
             coldamount (float): Cold ligand amount in nmol
             parameters (dict): Parameter input values
             compartment_volumes (dict): Compartment volumes in L
-            swept_parameters (list): Parameters to sweep over
-            swept_values (list): Values to sweep over
+            swept_parameters (list): Parameters to sweep over. Compartment names
+                sweep volumes, dose targets such as 'Vein.Hot' sweep the amount of
+                every cycle, 'Vein.Hot[1]' the amount of one cycle and 'times[1]'
+                the time of one cycle, on the roadrunner backend only.
+            swept_values (list): Values to sweep over, as a list of points, an
+                array [n_points, n_swept] or a Cohort
+            backend (str): "roadrunner" to run points on worker processes or
+                "jax" to vectorize them in one compiled computation
+            output_path (str): Directory to stream results to as points complete.
+                Rerunning the same sweep with the same path resumes it.
+            times (list): Output times in minutes, replacing the uniform grid of stop
+                and steps. Times may be non-uniform and span dose cycles, and the
+                integrator steps adaptively between them.
+            executor: Where roadrunner points run: "process" for the persistent
+                process pool, "thread", "serial", or a concurrent.futures.Executor
+                such as a Dask client's get_executor()
+            max_workers (int): Number of workers, defaults to cpu count
+            profile: True to record phase timings and failures of
+                each point in self.profile, or a callable also called with each
+                PointProfile as its point completes. Failed points are recorded
+                and return NaN instead of raising, and the result cache is not used.
+            nan_on_failure (bool): Return NaN for points whose integration fails
+                instead of raising
+            return_cold (bool): Also return the cold ligand amount of each region
+                in nmol, projected from the same integration as the hot TACs
+            dtype: Storage dtype of the results, e.g. np.float32 to halve their
+                memory. Integration always runs in double precision.
+            as_result (bool): Return a SimulationResult with labeled axes
+
+        With a ResultCache set through pycno.utils.cache.set_result_cache, only
+        points whose results are not cached are simulated.
 
         Returns:
-            TACs[n_curves, n_steps, n_observables]: Time activity curves in units of MBq.
+            time, TACs[n_curves, n_times, n_observables] in MBq, cold amounts in
+            nmol with return_cold, and PARAMS with output parameters, or a
+            SimulationResult with as_result. With output_path, results are
+            read-only memory-mapped arrays.
 
         """
+        start_time = time.perf_counter()
+        self.profile = get_profile(profile)
+
         self.dose = dose
-        self.dose.set_ids(self.sbml_model)
+        self.dose.set_ids(self.sbml_model, self.index)
 
         self.stop = stop
         self.steps = steps
@@ -188,105 +334,328 @@ class Model():
 
         self.ids_to_return = self.get_return_ids()
 
-        sbml_string = libsbml.writeSBMLToString(self.document)
+        self.TACs_masks = self.get_masks('Hot')
+        if return_cold:
+            # Cold rows are divided by the activity conversion applied to every row
+            self.TACs_masks = np.vstack([self.TACs_masks, self.get_masks('Cold') / self.NMOL2MBQ])
 
-        self.TACs_masks = sparse.csr_array(self.get_masks())
+        self.start_times = np.array(self.dose.times)
+        if times is not None:
+            self.time = np.asarray(times, dtype=float)
+            if self.time.ndim != 1 or not self.time.size or np.any(np.diff(self.time) <= 0):
+                raise ValueError("times must be a non-empty, strictly increasing sequence.")
+            self.stop = self.time[-1]
+        else:
+            self.end_times = np.append(np.array(self.dose.times)[1:], self.stop)
+            self.cycle_steps = np.rint((self.end_times - self.start_times) * self.steps / self.stop + 1).astype(int)
+
+            all_times = []
+            for start, end, n_steps in zip(self.start_times, self.end_times, self.cycle_steps):
+                n_steps = int(n_steps)
+                t_cycle = np.linspace(start, end, n_steps)
+                all_times.append(t_cycle[:-1])
+
+            self.time = np.concatenate(all_times)
+
+        # RoadRunner compiles the unmodified file once and applies overrides per
+        # run, while the jax conversion bakes them into the document
+        if backend == "jax":
+            sbml_string = libsbml.writeSBMLToString(self.document)
+            key = hashlib.sha256(sbml_string.encode()).hexdigest()
+            overrides = {}
+        else:
+            sbml_string = self.template_string
+            key = self.template_key
+            overrides = self.get_overrides()
+
+        spec = SimulationSpec(
+            key=key,
+            sbml_string=sbml_string,
+            ids_to_return=self.ids_to_return,
+            dose_ids=self.dose.ids,
+            dose_amounts=np.array(list(self.dose.targets.values()), dtype=float),
+            dose_times=self.start_times,
+            time=self.time,
+            masks=self.TACs_masks,
+            nmol2mbq=self.NMOL2MBQ,
+            n_output_parameters=len(self.output_parameters) if self.output_parameters is not None else 0,
+            maximum_integrator_steps=self.maximum_integrator_steps,
+            cache=get_default_cache(),
+            overrides=overrides,
+            nan_on_failure=nan_on_failure,
+            dtype=np.dtype(dtype).str)
+        if self.profile is not None:
+            self.profile.add_time("build", time.perf_counter() - start_time)
+
+        TACs, PARAMS = self.run_spec(spec, backend, swept_parameters, swept_values,
+                                     output_path, disable_progress_bar, executor, max_workers, self.profile)
+        if self.profile is not None:
+            self.profile.add_time("total", time.perf_counter() - start_time)
+
+        n_regions = len(self.output_compartments)
+        TACs, cold = (TACs[..., :n_regions], TACs[..., n_regions:]) if return_cold else (TACs, None)
+        if as_result:
+            return SimulationResult(self.time, list(self.output_compartments), TACs, cold,
+                                    self.output_parameters, PARAMS, swept_parameters, swept_values)
+        return (self.time, TACs) + ((cold,) if return_cold else ()) + \
+            ((PARAMS,) if self.output_parameters is not None else ())
+
+    def simulate_absorbed_dose(self,
+                               dose: Dose,
+                               stop: float = 60,
+                               output_compartments: list = None,
+                               s_values=None,
+                               swept_parameters: list = None,
+                               swept_values: list = None,
+                               disable_progress_bar: bool = False,
+                               maximum_integrator_steps: int = 20000,
+                               backend: str = "roadrunner",
+                               output_path: str = None,
+                               executor="process",
+                               max_workers: int = None,
+                               nan_on_failure: bool = False):
+        """
+        Simulates time-integrated activity and absorbed dose of regions.
+
+        Accumulator species integrating the hot amount of each region are
+        added to the model, so the integrator computes cumulated activity
+        directly and only their values at stop are returned.
+
+        Args:
+            dose (Dose): Dose
+            stop (float): Integration end time in minutes
+            output_compartments (list): Source regions, terms joined by '+' are summed
+            s_values: S-values in mGy/(MBq h) as an array [n_targets, n_regions],
+                a DataFrame with output_compartments as columns, or a vector of
+                self-dose S-values [n_regions]
+            swept_parameters (list): Parameters to sweep over, as in simulate
+            swept_values (list): Values to sweep over, as in simulate
+            backend (str): "roadrunner" or "jax"
+            output_path (str): Directory to stream TIAs to, as in simulate
+            executor: Where roadrunner points run, as in simulate
+            max_workers (int): Number of workers, as in simulate
+            nan_on_failure (bool): Return NaN for points whose integration fails
+                instead of raising
 
+        Returns:
+            TIA[n_curves, n_regions] in MBq h, and with s_values also
+            absorbed dose[n_curves, n_targets] in mGy.
+        """
+        self.dose = dose
+        self.dose.set_ids(self.sbml_model, self.index)
+        self.output_compartments = output_compartments or self.get_compartments()
+        self.output_parameters = None
+        self.time = np.array([float(stop)])
         self.start_times = np.array(self.dose.times)
-        self.end_times = np.append(np.array(self.dose.times)[1:], self.stop)
-        self.cycle_steps = np.rint((self.end_times - self.start_times) * self.steps / self.stop + 1).astype(int)
 
-        all_times = []
-        for start, end, n_steps in zip(self.start_times, self.end_times, self.cycle_steps):
-            n_steps = int(n_steps)
-            t_cycle = np.linspace(start, end, n_steps)
-            all_times.append(t_cycle[:-1])
+        if backend == "jax":
+            sbml_string = libsbml.writeSBMLToString(self.document)
+            overrides = {}
+        else:
+            sbml_string = self.template_string
+            overrides = self.get_overrides()
+        sources = [list(dict.fromkeys(tags)) for tags in self.get_tags('Hot')]
+        sbml_string, accumulator_ids = add_accumulators(sbml_string, sources)
+
+        # Accumulators hold nmol min, converted to MBq h through the masks
+        spec = SimulationSpec(
+            key=hashlib.sha256(sbml_string.encode()).hexdigest(),
+            sbml_string=sbml_string,
+            ids_to_return=accumulator_ids,
+            dose_ids=self.dose.ids,
+            dose_amounts=np.array(list(self.dose.targets.values()), dtype=float),
+            dose_times=self.start_times,
+            time=self.time,
+            masks=np.eye(len(accumulator_ids)) / 60,
+            nmol2mbq=self.NMOL2MBQ,
+            n_output_parameters=0,
+            maximum_integrator_steps=maximum_integrator_steps,
+            cache=get_default_cache(),
+            overrides=overrides,
+            nan_on_failure=nan_on_failure)
+
+        TACs, _ = self.run_spec(spec, backend, swept_parameters, swept_values,
+                                output_path, disable_progress_bar, executor, max_workers)
+        TIA = TACs[:, -1, :]
+        if s_values is None:
+            return TIA
+
+        if hasattr(s_values, "loc"):
+            s_values = s_values.loc[:, self.output_compartments].to_numpy()
+        s_values = np.asarray(s_values, dtype=float)
+        if s_values.ndim == 1:
+            return TIA, TIA * s_values
+        return TIA, TIA @ s_values.T
+
+    def run_spec(self, spec, backend, swept_parameters=None, swept_values=None,
+                 output_path=None, disable_progress_bar=False, executor="process", max_workers=None,
+                 profile=None):
+        """
+        Runs a simulation spec for every sweep point on the chosen backend.
 
-        self.time = np.concatenate(all_times)
+        With a Profile, every point is simulated and profiled, bypassing the result cache.
 
+        Returns:
+            (TACs, PARAMS or None)
+        """
+        if backend not in ("jax", "roadrunner"):
+            raise ValueError(f"Unknown backend {backend}.")
         if swept_parameters:
-            parameter_ids = []
-            for parameter in swept_parameters:
-                parameter_ids.append(get_parameter_id(
-                    self.sbml_model, parameter))
-
-            args = [(sbml_string, parameter_ids, values) for values in swept_values]
+            targets = self.get_sweep_targets(swept_parameters, self.dose)
+            if backend == "jax" and any(target.kind == "time" for target in targets):
+                raise ValueError("The jax backend cannot sweep dose times, use backend='roadrunner'.")
+            points = swept_values if hasattr(swept_values, "__getitem__") else list(swept_values)
         else:
-            args = [(sbml_string, None, None)]
+            targets = None
+            points = [None]
             disable_progress_bar = True
-        results = process_map(self.run_single_simulation, args, max_workers=os.cpu_count(
-        ), chunksize=1, disable=disable_progress_bar)
-        if self.output_parameters is not None:
-            TACs, PARAMS = [np.stack(res, axis=0) for res in zip(*results)]
-        else:
-            TACs = np.stack(results, axis=0)
 
-        if self.output_parameters is not None:
-            return self.time, TACs, PARAMS
+        if output_path is not None:
+            return self.stream_sweep(spec, backend, targets, points, output_path, disable_progress_bar,
+                                     executor, max_workers, profile)
+
+        result_cache = get_result_cache()
+        if result_cache is None or profile is not None:
+            results = self.compute_points(spec, backend, targets, points, np.arange(len(points)),
+                                          disable_progress_bar, executor, max_workers, profile)
         else:
-            return self.time, TACs
+            keys = get_point_keys(get_spec_fingerprint(spec, backend, targets), targets, points)
+            results = [result_cache.get(key) for key in keys]
+            missing = [i for i, result in enumerate(results) if result is None]
+            if missing:
+                computed = self.compute_points(spec, backend, targets, points, missing,
+                                               disable_progress_bar, executor, max_workers)
+                for i, result in zip(missing, computed):
+                    results[i] = result
+                    # Failed points returned as NaN are simulated again next time
+                    if np.isfinite(result[0]).all():
+                        result_cache.put(keys[i], *result, evict=False)
+                result_cache.evict()
+
+        with timed(profile, "stack"):
+            TACs = np.stack([TAC for TAC, _ in results], axis=0)
+            PARAMS = np.stack([PARAMS for _, PARAMS in results], axis=0) if spec.n_output_parameters else None
+        return TACs, PARAMS
+
+    def compute_points(self, spec, backend, targets, points, indices, disable_progress_bar=False,
+                       executor="process", max_workers=None, profile=None):
+        """
+        Simulates the sweep points at indices.
 
-    def run_single_simulation(self, args):
-        sbml_string, parameter_ids, swept_values = args
-        document = libsbml.readSBMLFromString(sbml_string)
-        sbml_model = document.getModel()
-        if parameter_ids is not None:
-            for i, pid in enumerate(parameter_ids):
-                sbml_model.getParameter(pid).setValue(float(swept_values[i]))
-            sbml_string = libsbml.writeSBMLToString(document)
+        Returns:
+            List of (TAC, PARAMS or None), in the order of indices
+        """
+        if backend == "jax":
+            from pycno.modeling.jax_backend import simulate_sweep
+            TACs, PARAMS = simulate_sweep(spec, targets, take_points(points, indices), profile)
+            if profile is not None:
+                profile.add_points(indices, get_finite_profiles(TACs))
+            return list(zip(TACs, PARAMS if PARAMS is not None else [None] * len(TACs)))
+
+        positions = {index: position for position, index in enumerate(indices)}
+        results = [None] * len(indices)
+        with timed(profile, "sweep"):
+            for chunk, chunk_results in iter_sweep(spec, targets, points, indices, disable_progress_bar,
+                                                   max_workers, executor=executor, profile=profile):
+                for index, result in zip(chunk, chunk_results):
+                    results[positions[index]] = result if spec.n_output_parameters else (result, None)
+        return results
+
+    def simulate_cohort(self, cohort, dose, **kwargs):
+        """
+        Simulates every patient of a virtual cohort.
 
-        rr = roadrunner.RoadRunner(sbml_string)
-        rr.integrator.maximum_num_steps = self.maximum_integrator_steps
-        rr.timeCourseSelections = self.ids_to_return
+        Patients are sampled chunk by chunk as they are sent to the backend.
 
-        num_cycles = len(self.dose.times)
-        all_time_segments = []
-        all_results_segments = []
-        for cycle in range(num_cycles):
-            for index, id in enumerate(self.dose.ids):
-                rr[f'{id}'] += list(self.dose.targets.values())[index][cycle]
+        Args:
+            cohort (Cohort): Virtual patient cohort
+            dose (Dose): Dose given to every patient
+            **kwargs: Other arguments of simulate
 
-            result_segment = rr.simulate(float(self.start_times[cycle]), float(self.end_times[cycle]), int(self.cycle_steps[cycle]))
-            time_segment = np.linspace(self.start_times[cycle], self.end_times[cycle], self.cycle_steps[cycle])
-            all_time_segments.append(time_segment[:-1])
-            all_results_segments.append(result_segment[:-1,:])
+        Returns:
+            (time, TACs[, PARAMS], patients) where patients is a DataFrame of
+            the sampled values of each patient, in the order of TACs. With
+            as_result, a SimulationResult holding patients.
+        """
+        results = self.simulate(dose, swept_parameters=cohort.names, swept_values=cohort, **kwargs)
+        if isinstance(results, SimulationResult):
+            results.patients = cohort.to_frame()
+            return results
+        return (*results, cohort.to_frame())
 
-        result = np.concatenate(all_results_segments)
+    def get_sweep_targets(self, swept_parameters, dose):
+        """
+        Resolves swept names to parameters, compartment volumes, dose amounts or dose times.
 
-        TAC = np.zeros((len(self.time), len(self.output_compartments)))
-        TAC = result @ self.TACs_masks.T * self.NMOL2MBQ
+        Args:
+            swept_parameters (list): Swept names
+            dose (Dose): Dose of the simulation
 
-        if self.output_parameters is not None:
-            PARAMS = np.zeros((len(self.time), len(self.output_parameters)))
-            PARAMS = np.stack(result[:,-len(self.output_parameters):])
-            return TAC, PARAMS
+        Returns:
+            List of SweepTarget
+        """
+        dose_targets = list(dose.targets)
+        targets = []
+        for name in swept_parameters:
+            base, _, cycle = name.partition('[')
+            cycle = int(cycle.rstrip(']')) if cycle else None
+            if name in self.index.parameter_ids:
+                targets.append(SweepTarget("element", id=self.index.parameter_ids[name]))
+            elif name in self.index.compartment_ids:
+                targets.append(SweepTarget("element", id=self.index.compartment_ids[name]))
+            elif base == "times" and cycle is not None:
+                targets.append(SweepTarget("time", cycle=cycle))
+            elif base in dose_targets:
+                targets.append(SweepTarget("dose", target=dose_targets.index(base), cycle=cycle))
+            else:
+                raise ValueError(f"{name} is not a parameter, compartment or dose target of the model.")
+            if cycle is not None and not -len(dose.times) <= cycle < len(dose.times):
+                raise DoseError(f"{name} refers to a dose cycle that is not in the dose.")
+        return targets
+
+    def stream_sweep(self, spec, backend, targets, points, output_path, disable_progress_bar=False,
+                     executor="process", max_workers=None, profile=None):
+        """
+        Runs sweep points that are not yet in the store at output_path and writes them as they complete.
+
+        Returns:
+            (TACs, PARAMS or None) as read-only memory-mapped arrays
+        """
+        fingerprint = get_spec_fingerprint(spec, backend, targets)
+        if hasattr(points, "fingerprint"):
+            fingerprint.update(points.fingerprint().encode())
+        elif targets:
+            fingerprint.update(np.ascontiguousarray(points, dtype=float).tobytes())
+
+        store = SweepStore(output_path, fingerprint.hexdigest(), len(points), len(spec.time),
+                           spec.masks.shape[0], spec.n_output_parameters, spec.dtype)
+        pending = store.get_pending()
+
+        if backend == "jax":
+            from pycno.modeling.jax_backend import simulate_sweep
+            for start in tqdm(range(0, len(pending), STREAM_CHUNKSIZE), disable=disable_progress_bar):
+                chunk = pending[start:start + STREAM_CHUNKSIZE]
+                TACs, PARAMS = simulate_sweep(spec, targets, take_points(points, chunk), profile)
+                if profile is not None:
+                    profile.add_points(chunk, get_finite_profiles(TACs))
+                store.write(chunk, TACs, PARAMS)
         else:
-            return TAC
+            for chunk, results in iter_sweep(spec, targets, points, pending, disable_progress_bar,
+                                             max_workers, STREAM_CHUNKSIZE, executor, profile):
+                if spec.n_output_parameters:
+                    TACs, PARAMS = [np.stack(res, axis=0) for res in zip(*results)]
+                else:
+                    TACs, PARAMS = np.stack(results, axis=0), None
+                store.write(chunk, TACs, PARAMS)
+        return store.load()
 
     def get_return_ids(self):
         ids = []
         for region in self.output_compartments:
-            if '+' in region:
-                terms = [term.strip() for term in region.split("+")]
-            else:
-                terms = []
-                terms.append(region)
-            for term in terms:
-                for compartment in self.sbml_model.getListOfCompartments():
-                    if compartment.getName() == term:
-                        compartment_id = compartment.getId()
-                        for other_comp in self.sbml_model.getListOfCompartments():
-                            if other_comp.getOutside() == compartment_id:
-                                other_comp_id = other_comp.getId()
-                                for species in self.sbml_model.getListOfSpecies():
-                                    if species.getCompartment() == other_comp_id:
-                                        ids.append(species.getId())
-                        for species in self.sbml_model.getListOfSpecies():
-                            if species.getCompartment() == compartment_id:
-                                ids.append(species.getId())
-                        break
+            for term in region.split("+"):
+                ids.extend(self.index.get_region_species(term.strip()))
         if self.output_parameters is not None:
-            [ids.append(get_parameter_id(self.sbml_model, p)) for p in self.output_parameters]
+            [ids.append(get_parameter_id(self.sbml_model, p, self.index)) for p in self.output_parameters]
 
         ids = list(dict.fromkeys(ids))
         return ids
@@ -301,148 +670,565 @@ class Model():
         libsbml.writeSBMLToFile(self.document, path)
 
     def get_compartments(self):
-        compartment_list = []
-        for compartment in self.sbml_model.getListOfCompartments():
-            if not compartment.getOutside():
-                compartment_list.append(compartment.getName())
-        return compartment_list
+        return [name for name, outside in self.index.compartments if not outside]
 
     def get_subcompartments(self):
-        subcompartment_list = []
-        for compartment in self.sbml_model.getListOfCompartments():
-            if compartment.getOutside():
-                subcompartment_list.append(compartment.getName())
-        return subcompartment_list
+        return [name for name, outside in self.index.compartments if outside]
 
     def get_parameters(self, return_values=True):
-        params = self.sbml_model.getListOfParameters()
         if return_values:
-            return [(p.getName(), p.getValue()) for p in params]
+            return [(name, self.index.parameter_values[pid]) for name, pid in self.index.parameter_ids.items()]
         else:
-            return [p.getName() for p in params]
+            return list(self.index.parameter_ids)
+
+    def get_masks(self, species_name='Hot'):
+        """
+        Returns masks [n_regions, n_selections] summing the species of each output region.
 
-    def get_masks(self):
-        masks = np.zeros((len(self.output_compartments), len(self.ids_to_return)), dtype=bool)
-        all_tags = self.get_tags('Hot')
+        Args:
+            species_name (str): Species whose name contains this, e.g. 'Hot' or 'Cold'
+        """
+        masks = np.zeros((len(self.output_compartments), len(self.ids_to_return)))
+        positions = {sid: j for j, sid in enumerate(self.ids_to_return)}
+        all_tags = self.get_tags(species_name)
         for idx, tags in enumerate(all_tags):
-            masks[idx, :] = np.isin(self.ids_to_return, tags)
+            masks[idx, [positions[tag] for tag in tags if tag in positions]] = 1.0
         return masks
 
     def get_tags(self, species_name):
         all_tags = []
         for region in self.output_compartments:
             tags = []
-            if '+' in region:
-                terms = [term.strip() for term in region.split("+")]
-            else:
-                terms = []
-                terms.append(region)
-            for term in terms:
-                for compartment in self.sbml_model.getListOfCompartments():
-                    if compartment.getName() == term:
-                        compartment_id = compartment.getId()
-                        for other_comp in self.sbml_model.getListOfCompartments():
-                            if other_comp.getOutside() == compartment_id:
-                                other_comp_id = other_comp.getId()
-                                for species in self.sbml_model.getListOfSpecies():
-                                    if species.getCompartment() == other_comp_id and species_name in species.getName():
-                                        tags.append(species.getId())
-                        for species in self.sbml_model.getListOfSpecies():
-                            if species.getCompartment() == compartment_id and species_name in species.getName():
-                                    tags.append(species.getId())
-                        break
+            for term in region.split("+"):
+                tags.extend(self.index.get_region_species(term.strip(), species_name))
             all_tags.append(tags)
         return all_tags
 
-    def create_jax_model(self, dose):
-        for idx, tag in enumerate(dose.ids):
-            species = self.sbml_model.getSpecies(tag)
-            species.setInitialAmount(list(dose.targets.values())[idx][0])
+    def get_region_masks(self, output_compartments, jax_model):
+        """
+        Returns masks [n_regions, n_y] summing the hot species of each region in the jax state.
+
+        Args:
+            output_compartments (list): Regions, terms joined by '+' are summed
+            jax_model (JaxModel): jax model of the current SBML document
+        """
+        self.output_compartments = output_compartments
+        self.output_parameters = None
+        self.ids_to_return = self.get_return_ids()
+        region_masks = jax_model.get_y_masks(self.ids_to_return, self.get_masks('Hot'))
+        for region, mask in zip(output_compartments, np.asarray(region_masks)):
+            if not mask.any():
+                raise ValueError(f"No hot species found for region '{region}'.")
+        return region_masks
 
+    def get_jax_model(self):
+        """
+        Returns the jax model of the current SBML document, converting it on first use.
+        """
+        from pycno.modeling.jax_backend import get_jax_model
         sbml_string = libsbml.writeSBMLToString(self.document)
-        return convert_model_to_jax(sbml_string)
-
-    # @eqx.filter_jit
-    def compute_sensitivities(self, dose: Dose, t, output_compartments):
-            dose.set_ids(self.sbml_model)
-            rollout, name_list_y, _, name_list_c, y0, c = self.create_jax_model(dose)
-            sig = inspect.signature(rollout)
-            y0 = sig.parameters["y0"].default
-            c = sig.parameters["c0"].default
-
-            stepsize_controller = diffrax.PIDController(atol=1e-10, rtol=1e-3)
-            def func(c, region_indices):
-                ys, _, _, c_updated = rollout(
-                    t1=0, ts=jnp.array([t-1, t]), deltaT=0.1, y0=y0, c0=c,
-                    stepsize_controller=stepsize_controller,
-                    max_steps=1_000_000,  # increased budget
-                )
-                tacs = jnp.zeros((len(region_indices), ys.shape[1]))
-                for i, idxs in enumerate(region_indices):
-                    tacs = tacs.at[i].set((ys.take(idxs, axis=0).sum(axis=0) * self.NMOL2MBQ))
-                return tacs, (tacs, c_updated) #for returning gradient and values
-
-            region_indices = []
-            for region in output_compartments:
-                if '+' in region:
-                    terms = [term.strip() for term in region.split("+")]
-                else:
-                    terms = []
-                    terms.append(region)
-                temp_indices = jnp.array([])
-                for term in terms:
-                    temp_indices = jnp.concatenate([temp_indices, get_indices(term, name_list_y)], dtype=jnp.int32)
-                region_indices.append(temp_indices)
-
-            grads, (tacs, c_updated) = eqx.filter_jacrev(func, has_aux=True)(c, region_indices)
-            grads = grads[:,-1,:]
-            sens =  (grads*c_updated).T/tacs[:,-1]
-            sens = sens / jnp.abs(jnp.max(sens))
-            return pd.DataFrame(sens, index=name_list_c, columns=output_compartments)
-
-
-def get_indices(region, compartment_list):
-    matches = [i for i, c in enumerate(compartment_list) if c.startswith(f'Hot{region}')]
-    if not matches:
-        print(f"No compartments found for '{region}'")
-        return jnp.zeros(1)
-    return jnp.array(matches)
-
-def set_parameter_values(sbml_model, parameter_dict_in):
-    parameter_dict = parameter_dict_in.copy()
-    for parameter in sbml_model.getListOfParameters():
-        for parameter_name in list(parameter_dict.keys()):
-            if parameter.getName() == parameter_name:
-                parameter.setValue(float(parameter_dict.pop(parameter_name)))
-    if parameter_dict:
-        [print(f"Parameter {parameter_name} not found in the model.")
-         for parameter_name in parameter_dict.keys()]
-
-def set_compartment_sizes(sbml_model, compartment_dict_in):
-    compartment_dict = compartment_dict_in.copy()
-    for comp in sbml_model.getListOfCompartments():
-        if comp.getName() in compartment_dict:
-            comp.setSize(float(compartment_dict[comp.getName()]))
-            compartment_dict.pop(comp.getName())
-    if compartment_dict:
-        for missing in compartment_dict.keys():
-            print(f"Compartment {missing} not found in the model.")
-
-def get_parameter(sbml_model, parameter_name):
-    for parameter in sbml_model.getListOfParameters():
-        if parameter.getName() == parameter_name:
-            return parameter.getValue()
+        return get_jax_model(hashlib.sha256(sbml_string.encode()).hexdigest(), sbml_string, get_default_cache())
+
+    def create_jax_model(self, dose):
+        """
+        Converts the model to jax with the first dose cycle in the initial state.
+
+        Later dose cycles are applied by integrating with rollout_schedule.
+
+        Args:
+            dose (Dose): Dose
+
+        Returns:
+            (rollout, name_list_y, name_list_w, name_list_c, y0, c)
+        """
+        import jax.numpy as jnp
+        jax_model = self.get_jax_model()
+        first_amounts = jnp.asarray([amounts[0] for amounts in dose.targets.values()], dtype=jax_model.y0.dtype)
+        y0 = jax_model.y0.at[jax_model.get_y_indices(dose.ids)].add(first_amounts)
+        return (jax_model.rollout, jax_model.name_list_y, jax_model.name_list_w,
+                jax_model.name_list_c, y0, jax_model.c0)
+
+    def compute_sensitivities(self, dose: Dose, t, output_compartments,
+                              swept_parameters: list = None,
+                              swept_values: list = None,
+                              normalize: bool = True,
+                              mode: str = "auto",
+                              profile=None):
+        """
+        Computes relative sensitivities dTAC/dc * c / TAC of region TACs to every model constant.
+
+        All time points and swept values are differentiated in one compiled call,
+        which is reused while the model, dose schedule and time points stay the same.
+
+        Args:
+            dose (Dose): Dose
+            t (float or list): Time point, or sorted time points, in minutes
+            output_compartments (list): Regions
+            swept_parameters (list): Parameters or compartments set for each entry of swept_values.
+                Initial assignments depending on them are evaluated from the set values.
+            swept_values (list): Values [n_sets, n_swept] to compute sensitivities at
+            normalize (bool): Scale sensitivities by their maximum at each time point
+            mode (str): "forward" or "reverse" mode differentiation, or "auto" to use
+                forward mode when there are fewer constants than outputs and the
+                rollout supports it
+            profile: True to record phase timings, including jax tracing and
+                compilation, in self.profile, or a callable also called with the
+                PointProfile of each set of swept values
+
+        Returns:
+            DataFrame [constants, regions] for a single time point without sweep, otherwise
+            an array [n_t, n_constants, n_regions], with a leading n_sets axis when sweeping.
+        """
+        import diffrax
+        import jax
+        import jax.numpy as jnp
+        import pandas as pd
+        from pycno.modeling.jax_backend import get_segments, sensitivity_batch, use_forward_mode
+        start_time = time.perf_counter()
+        self.profile = get_profile(profile)
+        dose.set_ids(self.sbml_model, self.index)
+        with timed(self.profile, "convert"):
+            jax_model = self.get_jax_model()
+        ts = np.atleast_1d(np.asarray(t, dtype=float))
+        region_masks = self.get_region_masks(output_compartments, jax_model)
+
+        if swept_parameters:
+            targets = self.get_sweep_targets(swept_parameters, dose)
+            if any(target.kind != "element" for target in targets):
+                raise ValueError("Only parameters and compartment volumes can be swept in compute_sensitivities.")
+            swept_ids = [target.id for target in targets]
+            values = np.asarray(take_points(swept_values, range(len(swept_values))), dtype=float)
+            values = values.reshape(len(values), len(targets))
+        else:
+            swept_ids = []
+            values = np.zeros((1, 0))
+
+        forward = use_forward_mode(jax_model.rollout, len(jax_model.c0), len(ts) * len(output_compartments), mode)
+
+        with timed(self.profile, "differentiate"), record_jax_compilation(self.profile):
+            grads, tacs, c_updated = jax.block_until_ready(sensitivity_batch(
+                jax_model.rollout, jax_model.y0, jax_model.c0,
+                jax_model.get_c_indices(swept_ids), jax_model.get_initializer(swept_ids),
+                jnp.asarray(values, dtype=jax_model.c0.dtype),
+                jax_model.get_y_indices(dose.ids),
+                jnp.asarray(list(dose.targets.values()), dtype=jax_model.y0.dtype),
+                get_segments(dose.times, ts),
+                region_masks,
+                self.NMOL2MBQ,
+                diffrax.PIDController(atol=1e-10, rtol=1e-3),
+                1_000_000,
+                forward))
+
+        with timed(self.profile, "transfer"):
+            sens = np.asarray(grads * c_updated[:, None, None, :] / tacs[..., None]).transpose(0, 1, 3, 2)
+        if normalize:
+            sens = sens / np.abs(sens.max(axis=(2, 3), keepdims=True))
+        if self.profile is not None:
+            self.profile.add_points(range(len(sens)), get_finite_profiles(sens))
+            self.profile.add_time("total", time.perf_counter() - start_time)
+
+        if swept_parameters:
+            return sens
+        if np.ndim(t) == 0:
+            return pd.DataFrame(sens[0, 0], index=jax_model.name_list_c, columns=output_compartments)
+        return sens[0]
+
+    def compute_fim(self, dose: Dose, times, output_compartments, parameters,
+                    schedules=None,
+                    relative_noise: float = 0.1,
+                    absolute_noise: float = 0.0,
+                    mode: str = "auto"):
+        """
+        Computes the Fisher information of parameters for imaging schedules.
+
+        TAC sensitivities are computed once at every candidate time in one
+        jitted call, and each schedule weights them by its scans, so many
+        schedules can be compared for the cost of one Jacobian.
+
+        Args:
+            dose (Dose): Dose
+            times (list): Sorted candidate scan times in minutes
+            output_compartments (list): Imaged regions
+            parameters (list): Parameters or compartments to estimate. Their effect
+                through the initial assignments depending on them is included.
+            schedules: None to scan at every candidate time, a list of schedules
+                each listing its scan times, or weights [n_schedules, n_t]
+            relative_noise (float): Measurement noise proportional to the TAC
+            absolute_noise (float): Constant measurement noise in MBq
+            mode (str): "forward", "reverse" or "auto" differentiation
+
+        Returns:
+            FisherInformation with standard errors, correlations and D-/E-optimality of each schedule
+        """
+        import diffrax
+        import jax.numpy as jnp
+        from pycno.modeling.jax_backend import get_segments, parameter_jacobian, use_forward_mode
+        dose.set_ids(self.sbml_model, self.index)
+        jax_model = self.get_jax_model()
+        times = np.asarray(times, dtype=float)
+        weights = get_design_weights(times, schedules)
+
+        targets = self.get_sweep_targets(parameters, dose)
+        if any(target.kind != "element" for target in targets):
+            raise ValueError("Only parameters and compartment volumes can be estimated with compute_fim.")
+
+        ids = [target.id for target in targets]
+        jacobian, TACs = parameter_jacobian(
+            jax_model.rollout, jax_model.y0, jax_model.c0,
+            jax_model.get_c_indices(ids), jax_model.get_initializer(ids),
+            jax_model.get_y_indices(dose.ids),
+            jnp.asarray(list(dose.targets.values()), dtype=jax_model.y0.dtype),
+            get_segments(dose.times, times),
+            self.get_region_masks(output_compartments, jax_model),
+            self.NMOL2MBQ,
+            diffrax.PIDController(atol=1e-10, rtol=1e-3),
+            1_000_000,
+            use_forward_mode(jax_model.rollout, len(targets), len(times) * len(output_compartments), mode))
+
+        return FisherInformation.from_jacobian(parameters, times, jacobian, TACs, weights,
+                                               relative_noise, absolute_noise)
+
+    def fit(self, dose, times, data, output_compartments, parameters,
+            bounds: dict = None,
+            prior: dict = None,
+            initial=None,
+            relative_noise: float = 0.1,
+            absolute_noise: float = 0.0,
+            max_iterations: int = 50,
+            mode: str = "auto"):
+        """
+        Fits parameters and compartment volumes to measured TACs of one or more patients.
+
+        All patients are fitted together by Levenberg-Marquardt in one jitted,
+        vectorized computation with jax-differentiated Jacobians. With a prior
+        the fit is a maximum a posteriori estimate, otherwise least squares.
+
+        Args:
+            dose (Dose or list): Dose of all patients, or one Dose per patient with the same targets and times
+            times (list): Sorted measurement times in minutes
+            data (np.ndarray): Measured TACs [n_t, n_regions] or [n_patients, n_t, n_regions]
+                in MBq, NaN where a patient was not measured
+            output_compartments (list): Measured regions
+            parameters (list): Parameters or compartments to fit. Initial assignments
+                depending on them, e.g. sub-compartment volumes, follow the fitted values.
+            bounds (dict): Name to (lower, upper), None or inf for no bound. Unlisted
+                parameters are kept positive.
+            prior (dict): Name to (mean, standard deviation) of a Gaussian prior
+            initial (np.ndarray): Initial values [n_p] or [n_patients, n_p], defaults to model values
+            relative_noise (float): Measurement noise proportional to the measured TAC
+            absolute_noise (float): Constant measurement noise in MBq
+            max_iterations (int): Number of Levenberg-Marquardt iterations
+            mode (str): "forward", "reverse" or "auto" differentiation
+
+        Returns:
+            FitResult with a leading n_patients axis
+        """
+        import diffrax
+        import jax.numpy as jnp
+        from pycno.modeling.fitting import FitResult, fit_batch, to_unbounded
+        from pycno.modeling.jax_backend import get_segments, use_forward_mode
+        times = np.asarray(times, dtype=float)
+        data = np.asarray(data, dtype=float)
+        if data.ndim == 2:
+            data = data[None]
+        n_patients = len(data)
+        if data.shape[1:] != (len(times), len(output_compartments)):
+            raise ValueError("data must have one row per time and one column per output compartment.")
+
+        doses = list(dose) if isinstance(dose, (list, tuple)) else [dose] * n_patients
+        if len(doses) != n_patients:
+            raise DoseError("Give one dose per patient.")
+        if any(d.times != doses[0].times or list(d.targets) != list(doses[0].targets) for d in doses):
+            raise DoseError("Doses of all patients must share their targets and times.")
+        doses[0].set_ids(self.sbml_model, self.index)
+
+        jax_model = self.get_jax_model()
+        targets = self.get_sweep_targets(parameters, doses[0])
+        if any(target.kind != "element" for target in targets):
+            raise ValueError("Only parameters and compartment volumes can be fitted.")
+        ids = [target.id for target in targets]
+        c_indices = jax_model.get_c_indices(ids)
+
+        bounds = bounds or {}
+        prior = prior or {}
+        lower, upper = [], []
+        for name in parameters:
+            low, high = bounds.get(name, (0, None))
+            lower.append(-np.inf if low is None else low)
+            upper.append(np.inf if high is None else high)
+        lower, upper = np.array(lower, dtype=float), np.array(upper, dtype=float)
+        prior_mean = np.array([prior[name][0] if name in prior else 0.0 for name in parameters])
+        prior_weight = np.array([1 / prior[name][1] if name in prior else 0.0 for name in parameters])
+
+        initial = np.asarray(jax_model.c0[c_indices] if initial is None else initial, dtype=float)
+        theta0 = to_unbounded(np.broadcast_to(initial, (n_patients, len(parameters))), lower, upper)
+
+        sigma = np.sqrt(absolute_noise**2 + (relative_noise * np.abs(data))**2)
+        weights = np.zeros_like(data)
+        np.divide(1.0, sigma, out=weights, where=np.isfinite(data) & (sigma > 0))
+
+        n_residuals = len(times) * len(output_compartments) + len(parameters)
+        dtype = jax_model.c0.dtype
+        values, standard_errors, cost, TACs = fit_batch(
+            jax_model.rollout, jax_model.y0, jax_model.c0, c_indices, jax_model.get_initializer(ids),
+            jax_model.get_y_indices(doses[0].ids),
+            jnp.asarray([list(d.targets.values()) for d in doses], dtype=jax_model.y0.dtype),
+            get_segments(doses[0].times, times),
+            self.get_region_masks(output_compartments, jax_model),
+            self.NMOL2MBQ,
+            diffrax.PIDController(atol=1e-10, rtol=1e-3),
+            1_000_000,
+            jnp.asarray(data, dtype=dtype), jnp.asarray(weights, dtype=dtype),
+            jnp.asarray(lower, dtype=dtype), jnp.asarray(upper, dtype=dtype),
+            jnp.asarray(prior_mean, dtype=dtype), jnp.asarray(prior_weight, dtype=dtype),
+            jnp.asarray(theta0, dtype=dtype),
+            max_iterations,
+            use_forward_mode(jax_model.rollout, len(parameters), n_residuals, mode))
+
+        return FitResult(list(parameters), times, np.asarray(values), np.asarray(standard_errors),
+                         np.asarray(cost), np.asarray(TACs))
+
+    def optimize_schedule(self, tumor_compartments, limits,
+                          hot_target: str = "Vein.Hot",
+                          cold_target: str = "Vein.Cold",
+                          cycles: list = (1, 2, 3, 4),
+                          hot_bounds: tuple = (0.0, 10.0),
+                          cold_bounds: tuple = (0.0, 100.0),
+                          interval_bounds: tuple = (20160.0, 80640.0),
+                          max_total_hot: float = None,
+                          s_values: dict = None,
+                          follow_up: float = None,
+                          population: int = 64,
+                          generations: int = 20,
+                          elite_fraction: float = 0.25,
+                          seed: int = None,
+                          disable_progress_bar: bool = True,
+                          maximum_integrator_steps: int = 20000,
+                          backend: str = "roadrunner",
+                          executor="process",
+                          max_workers: int = None):
+        """
+        Searches dose times, hot and cold amounts and the number of cycles maximizing tumour cumulated activity.
+
+        For each number of cycles, a cross-entropy search samples a generation
+        of schedules and simulates their cumulated activity in one sweep of
+        simulate_absorbed_dose, so every generation runs in parallel on workers
+        that keep the model compiled.
+        Schedules whose integration fails are ranked as infeasible.
+
+        Args:
+            tumor_compartments (list): Regions whose summed cumulated activity is maximized
+            limits (dict): Organ-at-risk regions, e.g. 'Kidney' or 'SG', to their
+                maximum cumulated activity in MBq h, or absorbed dose in mGy with s_values
+            hot_target (str): Dose target of the hot ligand
+            cold_target (str): Dose target of the cold ligand, or None to give no cold ligand
+            cycles (list): Numbers of dose cycles to search
+            hot_bounds (tuple): Hot amount per cycle in nmol
+            cold_bounds (tuple): Cold amount per cycle in nmol
+            interval_bounds (tuple): Minutes between consecutive cycles
+            max_total_hot (float): Limit of the hot amount summed over cycles in nmol, or None
+            s_values (dict): Self-dose S-values in mGy/(MBq h) of every tumour
+                and limited region, to optimize absorbed dose instead of cumulated activity
+            follow_up (float): Minutes integrated after the latest possible last
+                dose, defaults to ten physical half-lives
+            population (int): Schedules simulated per generation
+            generations (int): Maximum number of generations per number of cycles
+            elite_fraction (float): Share of schedules the search distribution is refitted to
+            seed (int): Random seed
+            backend (str): "roadrunner", or "jax" for a single cycle
+            executor: Where roadrunner points run, as in simulate
+            max_workers (int): Number of workers, as in simulate
+
+        Returns:
+            List of ScheduleResult, one per number of cycles, best first.
+        """
+        from pycno.modeling.optimization import (ScheduleResult, ScheduleSpace, cross_entropy_search,
+                                                 get_violation, rank_candidates)
+        if backend == "jax" and any(n_cycles > 1 for n_cycles in cycles):
+            raise ValueError("The jax backend cannot sweep dose times, so it only optimizes single cycle "
+                             "schedules. Use backend='roadrunner' or cycles=(1,).")
+        regions = list(dict.fromkeys([*tumor_compartments, *limits]))
+        limit_values = np.array([limits[region] for region in limits], dtype=float)
+        tumor_columns = [regions.index(region) for region in tumor_compartments]
+        limit_columns = [regions.index(region) for region in limits]
+        if s_values is not None:
+            missing = [region for region in regions if region not in s_values]
+            if missing:
+                raise ValueError(f"s_values are missing for {missing}.")
+            s_values = np.array([s_values[region] for region in regions], dtype=float)
+        if follow_up is None:
+            follow_up = 10 * np.log(2) / get_parameter(self.sbml_model, 'lambdaPhys', self.index)
+
+        results = []
+        for n_cycles in cycles:
+            space = ScheduleSpace(n_cycles, hot_target, cold_target, hot_bounds, cold_bounds, interval_bounds)
+            times, targets = space.get_schedule(space.decode(np.zeros((1, len(space))))[0])
+            template = Dose(times=times, targets=targets)
+            stop = space.last_time + follow_up
+
+            def evaluate(u):
+                values = space.decode(u)
+                outputs = self.simulate_absorbed_dose(
+                    template, stop, regions, s_values, space.names, values, disable_progress_bar,
+                    maximum_integrator_steps, backend, executor=executor, max_workers=max_workers,
+                    nan_on_failure=True)
+                outputs = outputs[1] if s_values is not None else outputs
+                violation = get_violation(outputs[:, limit_columns], limit_values)
+                if max_total_hot is not None:
+                    violation += np.maximum(space.get_hot_amounts(values).sum(axis=1) / max_total_hot - 1, 0)
+                return outputs[:, tumor_columns].sum(axis=1), violation
+
+            u, objective, violation, evaluations, history = cross_entropy_search(
+                evaluate, len(space), population, generations, elite_fraction,
+                None if seed is None else [seed, n_cycles])
+            values = space.decode(u[None])
+            outputs = self.simulate_absorbed_dose(template, stop, regions, s_values, space.names, values,
+                                                  True, maximum_integrator_steps, backend,
+                                                  executor=executor, max_workers=max_workers)
+            outputs = outputs[1] if s_values is not None else outputs
+            times, targets = space.get_schedule(values[0])
+            results.append(ScheduleResult(Dose(times=times, targets=targets), n_cycles, float(objective),
+                                          dict(zip(regions, outputs[0].tolist())), bool(violation == 0),
+                                          float(violation), evaluations, history))
+
+        order = rank_candidates(np.array([result.objective for result in results]),
+                                np.array([result.violation for result in results]))
+        return [results[i] for i in order]
+
+
+def get_spec_fingerprint(spec, backend, targets):
+    """
+    Returns a sha256 hash object identifying everything but the swept values of a simulation.
+
+    Args:
+        spec (SimulationSpec): Simulation
+        backend (str): Backend name
+        targets (list): SweepTarget of each swept column, or None
+    """
+    fingerprint = hashlib.sha256()
+    for item in (backend, spec.key, sorted((spec.overrides or {}).items()), spec.ids_to_return,
+                 spec.dose_ids, targets, spec.nmol2mbq, spec.n_output_parameters,
+                 spec.maximum_integrator_steps, spec.dtype):
+        fingerprint.update(repr(item).encode())
+    for array in (spec.dose_amounts, spec.dose_times, spec.time, spec.masks):
+        fingerprint.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return fingerprint
+
+def get_point_keys(fingerprint, targets, points):
+    """
+    Returns the result cache key of each sweep point.
+
+    Args:
+        fingerprint: Hash object from get_spec_fingerprint
+        targets (list): SweepTarget of each swept column, or None
+        points: Swept values for each point, see take_points
+    """
+    if not targets:
+        return [fingerprint.hexdigest()] * len(points)
+    values = np.asarray(take_points(points, np.arange(len(points))), dtype=float).reshape(len(points), -1)
+    keys = []
+    for row in values:
+        point_fingerprint = fingerprint.copy()
+        point_fingerprint.update(row.tobytes())
+        keys.append(point_fingerprint.hexdigest())
+    return keys
+
+def add_accumulators(sbml_string, sources):
+    """
+    Adds species integrating the summed amount of groups of species over time.
+
+    Species not in substance units appear as concentrations in math, so
+    they are multiplied by the size of their compartment.
+
+    Args:
+        sbml_string (str): SBML document
+        sources (list): Species ids accumulated by each accumulator
+
+    Returns:
+        (sbml_string, accumulator ids)
+    """
+    document = libsbml.readSBMLFromString(sbml_string)
+    sbml_model = document.getModel()
+    compartment_id = sbml_model.getCompartment(0).getId()
+    amounts = {}
+    for species in sbml_model.getListOfSpecies():
+        amounts[species.getId()] = species.getId() if species.getHasOnlySubstanceUnits() else \
+            f"{species.getId()} * {species.getCompartment()}"
+    ids = []
+    for i, species_ids in enumerate(sources):
+        accumulator_id = f"pycno_accumulator_{i}"
+        species = sbml_model.createSpecies()
+        species.setId(accumulator_id)
+        species.setCompartment(compartment_id)
+        species.setInitialAmount(0.0)
+        species.setHasOnlySubstanceUnits(True)
+        species.setBoundaryCondition(False)
+        species.setConstant(False)
+        rule = sbml_model.createRateRule()
+        rule.setVariable(accumulator_id)
+        rule.setMath(libsbml.parseL3Formula(" + ".join(amounts[sid] for sid in species_ids) if species_ids else "0"))
+        ids.append(accumulator_id)
+    return libsbml.writeSBMLToString(document), ids
+
+def set_parameter_values(sbml_model, parameter_dict_in, index=None):
+    index = index or ModelIndex(sbml_model)
+    for parameter_name, value in parameter_dict_in.items():
+        parameter_id = index.parameter_ids.get(parameter_name)
+        if parameter_id is None:
+            print(f"Parameter {parameter_name} not found in the model.")
+            continue
+        sbml_model.getParameter(parameter_id).setValue(float(value))
+        index.parameter_values[parameter_id] = float(value)
+
+def set_compartment_sizes(sbml_model, compartment_dict_in, index=None):
+    index = index or ModelIndex(sbml_model)
+    for compartment_name, size in compartment_dict_in.items():
+        compartment_id = index.compartment_ids.get(compartment_name)
+        if compartment_id is None:
+            print(f"Compartment {compartment_name} not found in the model.")
+            continue
+        sbml_model.getCompartment(compartment_id).setSize(float(size))
+        index.compartment_sizes[compartment_id] = float(size)
+
+def set_initial_assignments(sbml_model, ids, template_string, template_index):
+    """
+    Removes the initial assignments of elements given a value, and restores those of the others.
+
+    Args:
+        sbml_model (libsbml.Model): SBML model
+        ids (list): Ids of the elements given a value
+        template_string (str): SBML document the model was loaded from
+        template_index (ModelIndex): Index of the template
+    """
+    missing = [symbol for symbol in template_index.assigned_ids
+               if symbol not in ids and sbml_model.getInitialAssignment(symbol) is None]
+    if missing:
+        template = libsbml.readSBMLFromString(template_string).getModel()
+        for symbol in missing:
+            sbml_model.addInitialAssignment(template.getInitialAssignment(symbol))
+    for symbol in ids:
+        if sbml_model.getInitialAssignment(symbol) is not None:
+            sbml_model.removeInitialAssignment(symbol)
+
+def get_parameter(sbml_model, parameter_name, index=None):
+    index = index or ModelIndex(sbml_model)
+    parameter_id = index.parameter_ids.get(parameter_name)
+    if parameter_id is not None:
+        return index.parameter_values[parameter_id]
     print(f"Parameter {parameter_name} not found in the model.")
 
-def get_parameter_id(sbml_model, parameter_name):
-    for parameter in sbml_model.getListOfParameters():
-        if parameter.getName() == parameter_name:
-            return parameter.getId()
+def get_parameter_id(sbml_model, parameter_name, index=None):
+    index = index or ModelIndex(sbml_model)
+    parameter_id = index.parameter_ids.get(parameter_name)
+    if parameter_id is not None:
+        return parameter_id
     print(f"Parameter {parameter_name} not found in the model.")
 
-def get_species(species_name, result, sbml_model):
-    NMOL2MBQ = get_parameter(sbml_model, 'lambdaPhys') / \
+def get_species(species_name, result, sbml_model, index=None):
+    index = index or ModelIndex(sbml_model)
+    NMOL2MBQ = get_parameter(sbml_model, 'lambdaPhys', index) / \
         60 * 6.022e23 / 10**9 / 10**6
-    for species in sbml_model.getListOfSpecies():
-        if species.getName() == species_name.split('.')[1]:
-            return (result[f"{species.getId()}"] * NMOL2MBQ)
+    compartment_name, name = species_name.split('.')
+    species_id = index.get_species_id(compartment_name, name)
+    if species_id is not None:
+        return (result[f"{species_id}"] * NMOL2MBQ)
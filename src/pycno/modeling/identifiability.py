@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# FIMs whose smallest eigenvalue is below this fraction of the largest are treated as singular
+SINGULAR_TOLERANCE = 1e-12
+
+
+@dataclass
+class FisherInformation():
+    """
+    Fisher information of relative parameter changes for a batch of imaging schedules.
+
+    Derivatives are taken with respect to the log of each parameter, so standard
+    errors are relative (coefficients of variation).
+
+    Args:
+        parameters (list): Parameter names
+        times (np.ndarray): Candidate scan times
+        fim (np.ndarray): Fisher information matrices [n_schedules, n_p, n_p]
+        standard_errors (np.ndarray): Relative standard errors [n_schedules, n_p], inf if not identifiable
+        correlation (np.ndarray): Parameter correlation matrices [n_schedules, n_p, n_p]
+        d_optimality (np.ndarray): log det of the FIM [n_schedules], -inf if singular
+        e_optimality (np.ndarray): Smallest eigenvalue of the FIM [n_schedules]
+    """
+    parameters: list
+    times: np.ndarray
+    fim: np.ndarray
+    standard_errors: np.ndarray
+    correlation: np.ndarray
+    d_optimality: np.ndarray
+    e_optimality: np.ndarray
+
+    @classmethod
+    def from_jacobian(cls, parameters, times, jacobian, TACs, weights, relative_noise=0.1, absolute_noise=0.0):
+        """
+        Builds the Fisher information of each schedule from TAC sensitivities at all candidate times.
+
+        The measurement variance is absolute_noise**2 + (relative_noise * TAC)**2, and
+        measurements with zero variance are ignored.
+
+        Args:
+            parameters (list): Parameter names
+            times (np.ndarray): Candidate scan times
+            jacobian (np.ndarray): dTAC/dlog(p) [n_t, n_regions, n_p]
+            TACs (np.ndarray): TACs [n_t, n_regions] in MBq
+            weights (np.ndarray): Number of scans at each candidate time [n_schedules, n_t]
+            relative_noise (float): Noise proportional to the TAC
+            absolute_noise (float): Constant noise in MBq
+        """
+        jacobian = np.asarray(jacobian, dtype=float)
+        variance = absolute_noise**2 + (relative_noise * np.asarray(TACs, dtype=float))**2
+        precision = np.divide(1.0, variance, out=np.zeros_like(variance), where=variance > 0)
+        fim_per_time = np.einsum("trp,tr,trq->tpq", jacobian, precision, jacobian)
+        fim = np.einsum("st,tpq->spq", np.asarray(weights, dtype=float), fim_per_time)
+
+        eigenvalues = np.linalg.eigvalsh(fim)
+        e_optimality = eigenvalues[:, 0]
+        identifiable = e_optimality > SINGULAR_TOLERANCE * np.maximum(eigenvalues[:, -1], 0)
+        sign, logdet = np.linalg.slogdet(fim)
+        d_optimality = np.where(identifiable & (sign > 0), logdet, -np.inf)
+
+        n_parameters = len(parameters)
+        covariance = np.full_like(fim, np.nan)
+        if identifiable.any():
+            covariance[identifiable] = np.linalg.inv(fim[identifiable])
+        variances = np.diagonal(covariance, axis1=1, axis2=2)
+        standard_errors = np.where(identifiable[:, None], np.sqrt(np.abs(variances)), np.inf)
+        correlation = covariance / (standard_errors[:, :, None] * standard_errors[:, None, :])
+        correlation[~identifiable] = np.nan
+        correlation[:, np.arange(n_parameters), np.arange(n_parameters)] = np.where(identifiable[:, None], 1.0, np.nan)
+
+        return cls(list(parameters), np.asarray(times), fim, standard_errors, correlation,
+                   d_optimality, e_optimality)
+
+    def rank(self, criterion="d"):
+        """
+        Returns schedule indices from best to worst.
+
+        Args:
+            criterion (str): "d" for D-optimality or "e" for E-optimality
+        """
+        if criterion not in ("d", "e"):
+            raise ValueError(f"Unknown optimality criterion {criterion}.")
+        scores = self.d_optimality if criterion == "d" else self.e_optimality
+        return np.argsort(-scores, kind="stable")
+
+
+def get_design_weights(times, schedules=None):
+    """
+    Returns the number of scans at each candidate time for each schedule.
+
+    Args:
+        times (np.ndarray): Candidate scan times
+        schedules: None for one schedule scanning every candidate time, a list of
+            schedules each listing its scan times, or weights [n_schedules, n_t]
+
+    Returns:
+        Weights [n_schedules, n_t]
+    """
+    times = np.asarray(times, dtype=float)
+    if schedules is None:
+        return np.ones((1, len(times)))
+    if isinstance(schedules, np.ndarray) and schedules.ndim == 2:
+        if schedules.shape[1] != len(times):
+            raise ValueError("Schedule weights must have one column per candidate time.")
+        return schedules.astype(float)
+
+    weights = np.zeros((len(schedules), len(times)))
+    positions = {time: j for j, time in enumerate(times)}
+    for i, schedule in enumerate(schedules):
+        for time in schedule:
+            if float(time) not in positions:
+                raise ValueError(f"Scan time {time} is not one of the candidate times.")
+            weights[i, positions[float(time)]] += 1
+    return weights
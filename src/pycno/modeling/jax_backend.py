@@ -0,0 +1,434 @@
+import inspect
+
+import diffrax
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import libsbml
+import numpy as np
+
+from pycno.modeling.profiling import record_jax_compilation, timed
+from pycno.modeling.roadrunner_backend import (evaluate_math, get_affected, get_dependents, get_math_names,
+                                               sort_assignments)
+from pycno.modeling.sweep import split_times, take_points
+from pycno.utils.jax_conversion import convert_model_to_jax
+
+# Converted models kept alive in this process, keyed by SBML hash
+_jax_models = {}
+_MAX_JAX_MODELS = 8
+
+
+class InitialAssignments():
+    """
+    Initial assignments evaluated inside jitted code, from swept constants.
+
+    sbmltoodejax evaluates initial assignments once, when the model is
+    converted, so the constants and initial amounts depending on a swept
+    constant are evaluated again from its swept value.
+
+    Args:
+        assignments (list): (symbol, vector, index, math) of each assignment in
+            evaluation order, where vector is "y" or "c"
+        inputs (dict): Names read by the assignments to their (vector, index)
+    """
+    def __init__(self, assignments, inputs):
+        self.assignments = assignments
+        self.inputs = inputs
+
+    def __len__(self):
+        return len(self.assignments)
+
+    def __call__(self, y0, c):
+        """Returns y0 and c with the assignments evaluated from their values."""
+        vectors = {"y": y0, "c": c}
+        values = {name: vectors[vector][index] for name, (vector, index) in self.inputs.items()}
+        for symbol, vector, index, node in self.assignments:
+            values[symbol] = evaluate_math(node, values, jnp)
+            vectors[vector] = vectors[vector].at[index].set(values[symbol])
+        return vectors["y"], vectors["c"]
+
+
+class JaxModel():
+    """
+    jax rollout of an SBML document, converted once and reused across calls.
+
+    Args:
+        sbml_string (str): SBML document
+        cache (ModelCache): On-disk cache for the generated module, or None
+    """
+    def __init__(self, sbml_string, cache=None):
+        (self.rollout, self.name_list_y, self.name_list_w, self.name_list_c,
+         self.y0, self.c0) = convert_model_to_jax(sbml_string, cache=cache)
+        self.y0 = jnp.asarray(self.y0)
+        self.c0 = jnp.asarray(self.c0)
+        self.y_indexes = dict(self.rollout.y_indexes)
+        self.w_indexes = dict(self.rollout.w_indexes)
+        self.c_indexes = dict(self.rollout.c_indexes)
+
+        sbml_model = libsbml.readSBMLFromString(sbml_string).getModel()
+        self.amount_ids = {species.getId() for species in sbml_model.getListOfSpecies()
+                           if species.getHasOnlySubstanceUnits()}
+        self.assignments = {assignment.getSymbol(): assignment.getMath().deepCopy()
+                            for assignment in sbml_model.getListOfInitialAssignments()}
+        self.dependents = get_dependents(self.assignments)
+        self.order = sort_assignments(self.assignments)
+        self.initializers = {}
+
+    def get_y_indices(self, ids):
+        return jnp.array([self.y_indexes[sid] for sid in ids], dtype=jnp.int32)
+
+    def get_c_indices(self, ids):
+        missing = [sid for sid in ids if sid not in self.c_indexes]
+        if missing:
+            raise ValueError(f"{missing} are not constants of the jax model and cannot be swept.")
+        return jnp.array([self.c_indexes[sid] for sid in ids], dtype=jnp.int32)
+
+    def locate(self, sid):
+        """Returns the (vector, index) holding the value of an element, or None."""
+        if sid in self.c_indexes:
+            return "c", self.c_indexes[sid]
+        if sid in self.y_indexes and sid in self.amount_ids:
+            return "y", self.y_indexes[sid]
+        return None
+
+    def get_initializer(self, ids):
+        """
+        Returns the initial assignments depending on constants set at run time.
+
+        Assignments to the set constants themselves are dropped, so set values
+        replace them, as in CompiledModel.set_values. The same object is
+        returned for the same ids, so jitted functions taking it are reused.
+
+        Args:
+            ids (list): Constant ids
+
+        Returns:
+            InitialAssignments
+        """
+        ids = tuple(ids)
+        if ids in self.initializers:
+            return self.initializers[ids]
+        affected = get_affected(self.dependents, ids).difference(ids)
+        assignments, inputs = [], {}
+        for symbol in self.order:
+            if symbol not in affected:
+                continue
+            location = self.locate(symbol)
+            if location is None:
+                raise ValueError(f"{symbol} depends on {list(ids)} through an initial assignment, but is "
+                                 "not a constant or species amount of the jax model, so they cannot be set.")
+            assignments.append((symbol, *location, self.assignments[symbol]))
+            for name in get_math_names(self.assignments[symbol]):
+                if name in inputs or name in affected:
+                    continue
+                if self.locate(name) is None:
+                    raise ValueError(f"The initial assignment of {symbol} reads {name}, which the jax model "
+                                     f"does not hold as a constant, so {list(ids)} cannot be set.")
+                inputs[name] = self.locate(name)
+        initializer = self.initializers[ids] = InitialAssignments(assignments, inputs)
+        return initializer
+
+    def get_y_masks(self, ids, masks):
+        """
+        Projects region masks over selection ids onto the jax state vector.
+
+        Args:
+            ids (list): Selection ids
+            masks (np.ndarray): Region masks [n_regions, n_ids]
+
+        Returns:
+            Masks [n_regions, n_y]
+        """
+        masks = np.asarray(masks)
+        y_masks = np.zeros((masks.shape[0], len(self.y0)))
+        for j, sid in enumerate(ids):
+            if sid in self.y_indexes:
+                y_masks[:, self.y_indexes[sid]] = masks[:, j]
+        return jnp.asarray(y_masks, dtype=self.y0.dtype)
+
+    def get_parameter_rows(self, ids):
+        """
+        Returns rows of the stacked [y, w, c] outputs for each parameter id.
+
+        Args:
+            ids (list): Parameter ids
+        """
+        n_y, n_w = len(self.y_indexes), len(self.w_indexes)
+        rows = []
+        for sid in ids:
+            if sid in self.y_indexes:
+                rows.append(self.y_indexes[sid])
+            elif sid in self.w_indexes:
+                rows.append(n_y + self.w_indexes[sid])
+            elif sid in self.c_indexes:
+                rows.append(n_y + n_w + self.c_indexes[sid])
+            else:
+                raise ValueError(f"Parameter {sid} not found in the jax model.")
+        return jnp.array(rows, dtype=jnp.int32)
+
+
+def get_jax_model(key, sbml_string, cache=None):
+    """Returns the jax model for an SBML document, converting it on first use in this process."""
+    jax_model = _jax_models.pop(key, None)
+    if jax_model is None:
+        if len(_jax_models) >= _MAX_JAX_MODELS:
+            _jax_models.pop(next(iter(_jax_models)))
+        jax_model = JaxModel(sbml_string, cache)
+    _jax_models[key] = jax_model
+    return jax_model
+
+
+def supports_forward_mode(rollout):
+    """Returns whether the rollout takes a diffrax adjoint, which forward mode differentiation needs."""
+    return "adjoint" in inspect.signature(rollout.__call__).parameters
+
+
+def use_forward_mode(rollout, n_inputs, n_outputs, mode="auto"):
+    """
+    Chooses forward or reverse mode differentiation.
+
+    Args:
+        rollout: jax rollout
+        n_inputs (int): Number of differentiated inputs
+        n_outputs (int): Number of outputs
+        mode (str): "forward", "reverse" or "auto" to use forward mode when
+            there are fewer inputs than outputs and the rollout supports it
+    """
+    if mode not in ("auto", "forward", "reverse"):
+        raise ValueError(f"Unknown differentiation mode {mode}.")
+    if mode == "forward" and not supports_forward_mode(rollout):
+        raise ValueError("The jax rollout does not take a diffrax adjoint, so it only supports reverse mode.")
+    return mode == "forward" or (mode == "auto" and n_inputs < n_outputs and supports_forward_mode(rollout))
+
+
+def run_rollout(rollout, y0, c0, t0, ts, stepsize_controller, max_steps, adjoint=None):
+    """
+    Integrates the model from t0 and returns its outputs at ts.
+
+    Returns:
+        (ys[n_y, n_t], ws[n_w, n_t], c_updated)
+    """
+    kwargs = {} if adjoint is None else {"adjoint": adjoint}
+    ys, ws, _, c_updated = rollout(
+        t1=t0, ts=ts, deltaT=0.1, y0=y0, c0=c0,
+        stepsize_controller=stepsize_controller,
+        max_steps=max_steps,
+        **kwargs,
+    )
+    return ys, ws, c_updated
+
+
+def get_segments(dose_times, ts):
+    """
+    Splits output times into dose cycles.
+
+    Each segment integrates from its dose time to the next dose time, and
+    outputs the times falling in between. Output times before the first dose
+    get an undosed segment starting at the first output time, as on the
+    roadrunner backend.
+
+    Args:
+        dose_times (list): Dose times
+        ts (np.ndarray): Sorted output times
+
+    Returns:
+        List of (start, segment_ts, n_outputs, cycle) where segment_ts ends with
+        the next dose time for all but the last segment, and cycle is the dose
+        cycle given at start, or None for the undosed segment.
+    """
+    dose_times = np.asarray(dose_times, dtype=float)
+    ts = np.asarray(ts, dtype=float)
+    cycles = list(range(len(dose_times)))
+    if ts.size and ts[0] < dose_times[0]:
+        dose_times = np.insert(dose_times, 0, ts[0])
+        cycles.insert(0, None)
+    return [(jnp.asarray(start), jnp.asarray(outputs if end is None else np.append(outputs, end)), len(outputs), cycle)
+            for cycle, (start, outputs, end) in zip(cycles, split_times(dose_times, ts))]
+
+
+def rollout_schedule(rollout, y0, c0, dose_indices, dose_amounts, segments, stepsize_controller, max_steps,
+                     adjoint=None):
+    """
+    Integrates the model through a dose schedule.
+
+    Each dose is added to the state at the start of its segment, so the whole
+    schedule stays one differentiable function of y0, c0 and dose_amounts.
+
+    Args:
+        rollout: jax rollout
+        y0 (jnp.ndarray): Initial state
+        c0 (jnp.ndarray): Constants
+        dose_indices (jnp.ndarray): State indices receiving the dose
+        dose_amounts (jnp.ndarray): Dose amounts [n_targets, n_cycles] in nmol
+        segments (list): Segments from get_segments
+        stepsize_controller: diffrax step size controller
+        max_steps (int): Integrator step budget per segment
+        adjoint: diffrax adjoint, or None for the rollout default
+
+    Returns:
+        (ys[n_y, n_t], ws[n_w, n_t], c_updated)
+    """
+    y = y0
+    all_ys = []
+    all_ws = []
+    for t0, ts, n_outputs, cycle in segments:
+        if cycle is not None:
+            y = y.at[dose_indices].add(dose_amounts[:, cycle])
+        ys, ws, c_updated = run_rollout(rollout, y, c0, t0, ts, stepsize_controller, max_steps, adjoint)
+        all_ys.append(ys[:, :n_outputs])
+        all_ws.append(ws[:, :n_outputs])
+        y = ys[:, -1]
+    return jnp.concatenate(all_ys, axis=1), jnp.concatenate(all_ws, axis=1), c_updated
+
+
+@eqx.filter_jit
+def simulate_batch(rollout, y0, c0, c_indices, initialize, values, dose_indices, dose_amounts, segments,
+                   y_masks, parameter_rows, nmol2mbq, stepsize_controller, max_steps):
+    """
+    Simulates a batch of swept values in one compiled computation.
+
+    Args:
+        initialize (InitialAssignments): Initial assignments depending on the swept constants
+        values (jnp.ndarray): Swept constants [n_points, n_swept]
+        dose_amounts (jnp.ndarray): Dose amounts [n_points, n_targets, n_cycles]
+
+    Returns:
+        (TACs[n_points, n_t, n_regions], PARAMS[n_points, n_t, n_parameters])
+    """
+    def single(point_values, point_dose_amounts):
+        y, c = initialize(y0, c0.at[c_indices].set(point_values))
+        ys, ws, c_updated = rollout_schedule(rollout, y, c, dose_indices, point_dose_amounts, segments,
+                                             stepsize_controller, max_steps)
+        TAC = (y_masks @ ys).T * nmol2mbq
+        outputs = jnp.concatenate([ys, ws, jnp.broadcast_to(c_updated[:, None], (len(c_updated), ys.shape[1]))])
+        PARAMS = outputs[parameter_rows].T
+        return TAC, PARAMS
+
+    return jax.vmap(single)(values, dose_amounts)
+
+
+@eqx.filter_jit
+def sensitivity_batch(rollout, y0, c0, c_indices, initialize, values, dose_indices, dose_amounts, segments,
+                      y_masks, nmol2mbq, stepsize_controller, max_steps, forward):
+    """
+    Differentiates region TACs with respect to every constant, for a batch of swept values.
+
+    Derivatives are partial, holding the other constants fixed, at constants
+    whose initial assignments have been evaluated from the swept values.
+
+    Args:
+        initialize (InitialAssignments): Initial assignments depending on the swept constants
+        values (jnp.ndarray): Swept constants [n_points, n_swept]
+        y_masks (jnp.ndarray): Region masks [n_regions, n_y]
+        forward (bool): Use forward mode, cheaper when there are fewer constants than outputs
+
+    Returns:
+        (jacobians[n_points, n_t, n_regions, n_c], TACs[n_points, n_t, n_regions], c_updated[n_points, n_c])
+    """
+    adjoint = diffrax.ForwardMode() if forward else None
+
+    def tacs(c, y):
+        ys, _, c_updated = rollout_schedule(rollout, y, c, dose_indices, dose_amounts, segments,
+                                            stepsize_controller, max_steps, adjoint)
+        TAC = (y_masks @ ys).T * nmol2mbq
+        return TAC, (TAC, c_updated)
+
+    jacobian = jax.jacfwd if forward else jax.jacrev
+
+    def single(point_values):
+        y, c = initialize(y0, c0.at[c_indices].set(point_values))
+        return jacobian(tacs, has_aux=True)(c, y)
+
+    grads, (TACs, c_updated) = jax.vmap(single)(values)
+    return grads, TACs, c_updated
+
+
+@eqx.filter_jit
+def parameter_jacobian(rollout, y0, c0, c_indices, initialize, dose_indices, dose_amounts, segments,
+                       y_masks, nmol2mbq, stepsize_controller, max_steps, forward):
+    """
+    Differentiates region TACs with respect to the log of the constants at c_indices.
+
+    Derivatives include the effect of the constants through the initial
+    assignments depending on them.
+
+    Args:
+        c_indices (jnp.ndarray): Indices of the differentiated constants
+        initialize (InitialAssignments): Initial assignments depending on the differentiated constants
+        y_masks (jnp.ndarray): Region masks [n_regions, n_y]
+        forward (bool): Use forward mode, cheaper when there are fewer constants than outputs
+
+    Returns:
+        (jacobian[n_t, n_regions, n_p], TACs[n_t, n_regions])
+    """
+    adjoint = diffrax.ForwardMode() if forward else None
+
+    def tacs(values):
+        y, c = initialize(y0, c0.at[c_indices].set(values))
+        ys, _, _ = rollout_schedule(rollout, y, c, dose_indices, dose_amounts,
+                                    segments, stepsize_controller, max_steps, adjoint)
+        TAC = (y_masks @ ys).T * nmol2mbq
+        return TAC, TAC
+
+    jacobian = jax.jacfwd if forward else jax.jacrev
+    values = c0[c_indices]
+    grads, TACs = jacobian(tacs, has_aux=True)(values)
+    return grads * values, TACs
+
+
+def simulate_sweep(spec, targets, points, profile=None):
+    """
+    Simulates sweep points with the jax rollout, vectorized over points.
+
+    Args:
+        spec (SimulationSpec): Simulation shared by all points
+        targets (list): SweepTarget of each swept column, or None
+        points: Swept values for each point, see take_points
+        profile (Profile): Profile to record call phases to, or None. The
+            integrate phase includes the trace, lower and compile phases.
+
+    Returns:
+        (TACs[n_points, n_t, n_regions], PARAMS[n_points, n_t, n_parameters] or None)
+    """
+    with timed(profile, "convert"):
+        jax_model = get_jax_model(spec.key, spec.sbml_string, spec.cache)
+    targets = targets or []
+    values = np.asarray(take_points(points, range(len(points))) if targets else [[]] * len(points),
+                        dtype=float).reshape(len(points), len(targets))
+
+    element_columns = []
+    dose_amounts = np.repeat(np.asarray(spec.dose_amounts, dtype=float)[None], len(points), axis=0)
+    for column, target in enumerate(targets):
+        if target.kind == "element":
+            element_columns.append(column)
+        elif target.kind == "dose" and target.cycle is None:
+            dose_amounts[:, target.target, :] = values[:, column, None]
+        elif target.kind == "dose":
+            dose_amounts[:, target.target, target.cycle] = values[:, column]
+        else:
+            raise ValueError("The jax backend cannot sweep dose times, use backend='roadrunner'.")
+
+    n_parameters = spec.n_output_parameters
+    parameter_rows = jax_model.get_parameter_rows(spec.ids_to_return[len(spec.ids_to_return) - n_parameters:]
+                                                  if n_parameters else [])
+
+    element_ids = [targets[column].id for column in element_columns]
+    with timed(profile, "integrate"), record_jax_compilation(profile):
+        TACs, PARAMS = jax.block_until_ready(simulate_batch(
+            jax_model.rollout, jax_model.y0, jax_model.c0,
+            jax_model.get_c_indices(element_ids),
+            jax_model.get_initializer(element_ids),
+            jnp.asarray(values[:, element_columns], dtype=jax_model.c0.dtype),
+            jax_model.get_y_indices(spec.dose_ids),
+            jnp.asarray(dose_amounts, dtype=jax_model.y0.dtype),
+            get_segments(spec.dose_times, spec.time),
+            jax_model.get_y_masks(spec.ids_to_return, spec.masks),
+            parameter_rows,
+            spec.nmol2mbq,
+            diffrax.PIDController(atol=1e-10, rtol=1e-3),
+            spec.maximum_integrator_steps))
+
+    with timed(profile, "transfer"):
+        TACs = np.asarray(TACs, dtype=spec.dtype)
+        PARAMS = np.asarray(PARAMS, dtype=spec.dtype) if n_parameters else None
+    return TACs, PARAMS
@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Share of the previous search distribution kept at each generation
+SMOOTHING = 0.3
+
+# Spread of the search distribution, relative to the bounds, below which the search stops
+CONVERGENCE_TOLERANCE = 1e-3
+
+
+@dataclass
+class ScheduleResult():
+    """
+    Best dose schedule found for one number of cycles.
+
+    Args:
+        dose (Dose): Best schedule
+        n_cycles (int): Number of dose cycles
+        objective (float): Summed tumour cumulated activity in MBq h, or absorbed dose in mGy with s_values
+        outputs (dict): Cumulated activity, or absorbed dose, of each output region
+        feasible (bool): Whether the schedule respects every limit
+        violation (float): Summed relative excess over the limits, 0 if feasible
+        evaluations (int): Number of simulated schedules
+        history (np.ndarray): Best objective after each generation, NaN while no schedule is feasible
+    """
+    dose: object
+    n_cycles: int
+    objective: float
+    outputs: dict
+    feasible: bool
+    violation: float
+    evaluations: int
+    history: np.ndarray
+
+
+class ScheduleSpace():
+    """
+    Maps points of the unit hypercube to dose schedules of a fixed number of cycles.
+
+    Each cycle has a hot amount and, with a cold target, a cold amount. Cycles
+    after the first have an interval to the previous cycle, so dose times
+    always increase.
+
+    Args:
+        n_cycles (int): Number of dose cycles
+        hot_target (str): Dose target of the hot ligand, e.g. 'Vein.Hot'
+        cold_target (str): Dose target of the cold ligand, or None to give no cold ligand
+        hot_bounds (tuple): Hot amount per cycle in nmol
+        cold_bounds (tuple): Cold amount per cycle in nmol
+        interval_bounds (tuple): Minutes between consecutive cycles
+    """
+    def __init__(self, n_cycles, hot_target, cold_target, hot_bounds, cold_bounds, interval_bounds):
+        self.n_cycles = n_cycles
+        self.hot_target = hot_target
+        self.cold_target = cold_target
+
+        self.names = [f"{hot_target}[{cycle}]" for cycle in range(n_cycles)]
+        bounds = [hot_bounds] * n_cycles
+        if cold_target is not None:
+            self.names += [f"{cold_target}[{cycle}]" for cycle in range(n_cycles)]
+            bounds += [cold_bounds] * n_cycles
+        self.names += [f"times[{cycle}]" for cycle in range(1, n_cycles)]
+        bounds += [interval_bounds] * (n_cycles - 1)
+
+        self.lower, self.upper = np.asarray(bounds, dtype=float).reshape(-1, 2).T
+        if np.any(self.lower > self.upper) or np.any(self.lower < 0):
+            raise ValueError("Bounds must be non-negative (lower, upper) pairs.")
+        self.last_time = (n_cycles - 1) * float(interval_bounds[1])
+
+    def __len__(self):
+        return len(self.names)
+
+    def decode(self, u):
+        """
+        Returns swept values [n, len(names)] of points u [n, len(names)] of the unit hypercube.
+
+        Intervals are accumulated into dose times.
+        """
+        values = self.lower + np.clip(u, 0, 1) * (self.upper - self.lower)
+        n_intervals = self.n_cycles - 1
+        if n_intervals:
+            values[:, -n_intervals:] = np.cumsum(values[:, -n_intervals:], axis=1)
+        return values
+
+    def get_hot_amounts(self, values):
+        """Returns hot amounts [n, n_cycles] of swept values."""
+        return values[:, :self.n_cycles]
+
+    def get_schedule(self, values):
+        """
+        Returns (times, targets) of a Dose for one row of swept values.
+
+        Args:
+            values (np.ndarray): Swept values [len(names)]
+        """
+        n = self.n_cycles
+        targets = {self.hot_target: [float(value) for value in values[:n]]}
+        if self.cold_target is not None:
+            targets[self.cold_target] = [float(value) for value in values[n:2 * n]]
+        times = [0.0] + [float(value) for value in values[len(values) - (n - 1):]] if n > 1 else [0.0]
+        return times, targets
+
+
+def get_violation(outputs, limits):
+    """
+    Returns the summed relative excess of outputs over their limits.
+
+    Args:
+        outputs (np.ndarray): Outputs [n, n_limits]
+        limits (np.ndarray): Upper limits [n_limits]
+    """
+    return np.maximum(outputs / limits - 1, 0).sum(axis=1)
+
+
+def rank_candidates(objective, violation):
+    """
+    Orders candidates from best to worst.
+
+    Feasible candidates come first, by decreasing objective, followed by
+    infeasible candidates by increasing violation.
+    """
+    objective = np.where(np.isfinite(objective), objective, -np.inf)
+    violation = np.where(np.isfinite(violation), violation, np.inf)
+    return np.lexsort((-objective, violation))
+
+
+def cross_entropy_search(evaluate, n_dims, population=64, generations=20, elite_fraction=0.25, seed=None):
+    """
+    Maximizes an objective under constraints by the cross-entropy method on the unit hypercube.
+
+    Every generation samples a batch of candidates from a normal distribution,
+    evaluates them in one call, and refits the distribution to the best
+    candidates.
+
+    Args:
+        evaluate (callable): Maps candidates [population, n_dims] to (objective, violation) [population]
+        n_dims (int): Number of dimensions
+        population (int): Candidates per generation
+        generations (int): Maximum number of generations
+        elite_fraction (float): Share of candidates the distribution is refitted to
+        seed (int): Random seed
+
+    Returns:
+        (best candidate, objective, violation, evaluations, history of the best objective)
+    """
+    rng = np.random.default_rng(seed)
+    n_elite = max(2, int(np.ceil(elite_fraction * population)))
+    mean = np.full(n_dims, 0.5)
+    std = np.full(n_dims, 0.5)
+
+    best_u, best_objective, best_violation = None, -np.inf, np.inf
+    evaluations = 0
+    history = []
+    for generation in range(generations):
+        if generation == 0:
+            u = rng.random((population, n_dims))
+        else:
+            u = np.clip(mean + std * rng.standard_normal((population, n_dims)), 0, 1)
+        objective, violation = evaluate(u)
+        evaluations += population
+
+        # The best candidate so far competes with every generation
+        if best_u is not None:
+            u = np.vstack([u, best_u])
+            objective = np.append(objective, best_objective)
+            violation = np.append(violation, best_violation)
+        order = rank_candidates(objective, violation)
+        best_u, best_objective, best_violation = u[order[0]], objective[order[0]], violation[order[0]]
+        history.append(best_objective if best_violation == 0 else np.nan)
+
+        elite = u[order[:n_elite]]
+        mean = SMOOTHING * mean + (1 - SMOOTHING) * elite.mean(axis=0)
+        std = SMOOTHING * std + (1 - SMOOTHING) * elite.std(axis=0)
+        if std.max() < CONVERGENCE_TOLERANCE:
+            break
+
+    return best_u, best_objective, best_violation, evaluations, np.asarray(history)
@@ -0,0 +1,163 @@
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# jax compilation events recorded as phases of a Profile
+JAX_COMPILE_EVENTS = {
+    "/jax/core/compile/jaxpr_trace_duration": "trace",
+    "/jax/core/compile/jaxpr_to_mlir_module_duration": "lower",
+    "/jax/core/compile/backend_compile_duration": "compile",
+}
+
+
+@dataclass
+class PointProfile():
+    """
+    Timings and outcome of one sweep point.
+
+    Args:
+        index (int): Index of the point in the sweep
+        phases (dict): Seconds spent in each phase. Phases shared by a chunk of
+            points, such as transfers, are divided evenly between its points.
+        failed (bool): Whether the integration failed or returned non-finite values
+        error (str): Error message of a failed point
+        worker (int): Process id of the worker that ran the point
+    """
+    index: int = None
+    phases: dict = field(default_factory=dict)
+    failed: bool = False
+    error: str = None
+    worker: int = None
+
+    @property
+    def step_limit_reached(self):
+        """Whether the point failed because it used its maximum_integrator_steps."""
+        return self.error is not None and ("CV_TOO_MUCH_WORK" in self.error or "max_steps" in self.error)
+
+
+class Profile():
+    """
+    Timings and failures of a simulate or compute_sensitivities call.
+
+    Args:
+        hook (callable): Called with each PointProfile as its point completes, or None
+    """
+    def __init__(self, hook=None):
+        self.hook = hook
+        self.phases = {}
+        self.points = []
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the block to a phase of the call."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_points(self, indices, point_profiles):
+        """
+        Records the profiles of completed points.
+
+        Args:
+            indices (list): Sweep index of each point
+            point_profiles (list): PointProfile of each point
+        """
+        for index, point_profile in zip(indices, point_profiles):
+            point_profile.index = int(index)
+            self.points.append(point_profile)
+            if self.hook is not None:
+                self.hook(point_profile)
+
+    @property
+    def failures(self):
+        """Profiles of the points that failed."""
+        return [point for point in self.points if point.failed]
+
+    def slowest(self, n=10, phase=None):
+        """
+        Returns the profiles of the slowest points.
+
+        Args:
+            n (int): Number of points
+            phase (str): Phase to rank by, defaults to the total of all phases
+        """
+        def seconds(point):
+            return point.phases.get(phase, 0.0) if phase else sum(point.phases.values())
+        return sorted(self.points, key=seconds, reverse=True)[:n]
+
+    def summary(self):
+        """Returns total seconds of each call phase and of each point phase summed over points."""
+        totals = dict(self.phases)
+        for point in self.points:
+            for name, seconds in point.phases.items():
+                totals[f"points.{name}"] = totals.get(f"points.{name}", 0.0) + seconds
+        return totals
+
+    def to_frame(self):
+        """Returns one row per point with its phases in seconds and failure status."""
+        import pandas as pd
+        rows = [{**point.phases, "failed": point.failed, "error": point.error, "worker": point.worker}
+                for point in self.points]
+        return pd.DataFrame(rows, index=pd.Index([point.index for point in self.points], name="point"))
+
+    def __repr__(self):
+        phases = ", ".join(f"{name}={seconds:.3g}s" for name, seconds in self.summary().items())
+        return f"Profile({len(self.points)} points, {len(self.failures)} failed, {phases})"
+
+
+def get_profile(profile):
+    """
+    Resolves the profile argument of simulate and compute_sensitivities.
+
+    Args:
+        profile: False or None to disable profiling, True to profile, or a
+            callable called with each PointProfile
+
+    Returns:
+        Profile or None
+    """
+    if not profile:
+        return None
+    return Profile(profile if callable(profile) else None)
+
+
+def timed(profile, name):
+    """Returns a context manager adding the time spent in its block to a phase of profile, if any."""
+    return profile.phase(name) if profile is not None else nullcontext()
+
+
+@contextmanager
+def record_jax_compilation(profile):
+    """Adds jax tracing, lowering and compilation time in the block to phases of profile."""
+    if profile is None:
+        yield
+        return
+    import jax.monitoring
+
+    def listener(event, seconds, **kwargs):
+        if event in JAX_COMPILE_EVENTS:
+            profile.add_time(JAX_COMPILE_EVENTS[event], seconds)
+
+    jax.monitoring.register_event_duration_secs_listener(listener)
+    try:
+        yield
+    finally:
+        jax.monitoring.unregister_event_duration_listener(listener)
+
+
+def get_finite_profiles(results):
+    """
+    Returns a PointProfile for each point of a batch, marking points with non-finite results as failed.
+
+    Args:
+        results (np.ndarray): Results with a leading n_points axis
+    """
+    finite = np.isfinite(np.asarray(results).reshape(len(results), -1)).all(axis=1)
+    return [PointProfile(failed=not ok, error=None if ok else "Non-finite result") for ok in finite]
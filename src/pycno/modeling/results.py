@@ -0,0 +1,75 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SimulationResult():
+    """
+    Results of simulate with labeled axes.
+
+    TACs and cold have axes (point, time, region), and PARAMS has axes
+    (point, time, parameter).
+
+    Args:
+        time (np.ndarray): Output times in minutes [n_t]
+        regions (list): Output regions
+        TACs (np.ndarray): Hot ligand time activity curves in MBq [n_points, n_t, n_regions]
+        cold (np.ndarray): Cold ligand amounts in nmol [n_points, n_t, n_regions], or None
+        parameters (list): Output parameter names, or None
+        PARAMS (np.ndarray): Output parameter values [n_points, n_t, n_parameters], or None
+        swept_parameters (list): Swept names, or None
+        swept_values: Swept values of each point, or None
+        patients: DataFrame of the sampled values of each point of a cohort, or None
+    """
+    time: np.ndarray
+    regions: list
+    TACs: np.ndarray
+    cold: np.ndarray = None
+    parameters: list = None
+    PARAMS: np.ndarray = None
+    swept_parameters: list = None
+    swept_values: object = None
+    patients: object = None
+
+    dims = ("point", "time", "region")
+
+    def get(self, region, species="hot"):
+        """
+        Returns the curves of one region [n_points, n_t].
+
+        Args:
+            region (str): Output region
+            species (str): "hot" for activity in MBq or "cold" for amounts in nmol
+        """
+        return self.get_species(species)[:, :, self.regions.index(region)]
+
+    def get_species(self, species="hot"):
+        if species == "hot":
+            return self.TACs
+        if species == "cold":
+            if self.cold is None:
+                raise ValueError("Cold species were not returned, simulate with return_cold=True.")
+            return self.cold
+        raise ValueError(f"Unknown species {species}.")
+
+    @property
+    def nbytes(self):
+        """Memory held by the result arrays in bytes."""
+        return sum(array.nbytes for array in (self.TACs, self.cold, self.PARAMS) if array is not None)
+
+    def to_frame(self, species="hot"):
+        """
+        Returns the curves as a DataFrame indexed by point and time, with a column per region.
+
+        Args:
+            species (str): "hot", "cold", or "parameters" for the output parameters
+        """
+        import pandas as pd
+        if species == "parameters":
+            values, columns = self.PARAMS, self.parameters
+        else:
+            values, columns = self.get_species(species), self.regions
+        n_points, n_times = values.shape[:2]
+        index = pd.MultiIndex.from_product([np.arange(n_points), self.time], names=self.dims[:2])
+        return pd.DataFrame(np.asarray(values).reshape(n_points * n_times, -1), index=index, columns=columns)
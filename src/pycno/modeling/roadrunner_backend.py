@@ -0,0 +1,446 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import libsbml
+import numpy as np
+import roadrunner
+from tqdm import tqdm
+
+from pycno.modeling.executors import SharedInput, get_executor, shutdown_workers
+from pycno.modeling.profiling import PointProfile
+from pycno.modeling.sweep import apply_point, split_times, take_points
+
+# Compiled models kept alive in each worker thread, keyed by SBML hash
+_local = threading.local()
+_MAX_COMPILED_MODELS = 8
+
+# Seconds of work per chunk once the time per point has been measured
+TARGET_CHUNK_SECONDS = 0.5
+
+
+@dataclass
+class SimulationSpec():
+    """
+    Everything a worker needs to run sweep points for one simulate call.
+
+    Args:
+        key (str): Hash of the SBML document, used to reuse compiled models
+        sbml_string (str): SBML document
+        ids_to_return (list): RoadRunner time course selections
+        dose_ids (list): Species ids receiving the dose
+        dose_amounts (np.ndarray): Dose amounts [n_targets, n_cycles] in nmol
+        dose_times (np.ndarray): Dose time of each cycle
+        time (np.ndarray): Output times
+        masks (np.ndarray): Projection of selections onto regions [n_regions, n_selections]
+        nmol2mbq (float): Conversion from nmol to MBq
+        n_output_parameters (int): Number of trailing selections that are parameters
+        maximum_integrator_steps (int): Integrator step budget
+        cache (ModelCache): On-disk cache of compiled models, or None
+        overrides (dict): Element values applied to every point, by id
+        nan_on_failure (bool): Return NaN for points whose integration fails instead of raising
+        dtype (str): Storage dtype of the results
+    """
+    key: str
+    sbml_string: str
+    ids_to_return: list
+    dose_ids: list
+    dose_amounts: np.ndarray
+    dose_times: np.ndarray
+    time: np.ndarray
+    masks: object
+    nmol2mbq: float
+    n_output_parameters: int
+    maximum_integrator_steps: int
+    cache: object = None
+    overrides: dict = None
+    nan_on_failure: bool = False
+    dtype: str = "<f8"
+
+
+class CompiledModel():
+    """
+    RoadRunner instance compiled once and reused for many sweep points.
+
+    Setting ``init()`` values in RoadRunner regenerates the model, so swept
+    values are set directly and the initial assignments depending on them are
+    re-evaluated here.
+
+    Args:
+        sbml_string (str): SBML document
+        cache (ModelCache): On-disk cache of compiled models, or None
+    """
+    def __init__(self, sbml_string, cache=None):
+        self.rr = load_roadrunner(sbml_string, cache)
+        sbml_model = libsbml.readSBMLFromString(sbml_string).getModel()
+
+        self.concentration_ids = {species.getId() for species in sbml_model.getListOfSpecies()
+                                  if not species.getHasOnlySubstanceUnits()}
+        self.defaults = {}
+        for element_list in (sbml_model.getListOfParameters(),
+                             sbml_model.getListOfCompartments(),
+                             sbml_model.getListOfSpecies()):
+            for element in element_list:
+                self.defaults[element.getId()] = self.rr[self.selection(element.getId())]
+
+        self.assignments = {assignment.getSymbol(): assignment.getMath().deepCopy()
+                            for assignment in sbml_model.getListOfInitialAssignments()}
+        self.dependents = get_dependents(self.assignments)
+        self.order = sort_assignments(self.assignments)
+        self.changed = set()
+
+    def selection(self, sid):
+        if sid in self.concentration_ids:
+            return f'[{sid}]'
+        return sid
+
+    def set_values(self, ids, values):
+        """
+        Resets the model and applies values to elements by id.
+
+        Initial assignments depending on the set elements are re-evaluated,
+        and elements changed by a previous call are restored.
+
+        Args:
+            ids (list): Element ids
+            values (list): Values for each id
+        """
+        overrides = dict(zip(ids, (float(v) for v in values)))
+        affected = get_affected(self.dependents, overrides).difference(overrides)
+
+        current = dict(self.defaults)
+        current.update(overrides)
+        for symbol in self.order:
+            if symbol in affected:
+                current[symbol] = evaluate_math(self.assignments[symbol], current)
+
+        updated = set(overrides) | affected
+        self.rr.reset()
+        for sid in updated | self.changed:
+            self.rr[self.selection(sid)] = current[sid]
+        self.changed = updated
+
+    def apply_point(self, spec, targets, values):
+        """
+        Resets the model to the values of a sweep point.
+
+        Returns:
+            (dose_amounts, dose_times) of the point, starting with an empty dose
+            when the first dose is swept past the first output time.
+        """
+        element_ids, element_values, dose_amounts, dose_times = apply_point(
+            targets, values, spec.dose_amounts, spec.dose_times)
+        overrides = dict(spec.overrides or {})
+        overrides.update(zip(element_ids, element_values))
+        self.set_values(list(overrides), list(overrides.values()))
+        self.rr.integrator.maximum_num_steps = spec.maximum_integrator_steps
+        self.rr.timeCourseSelections = spec.ids_to_return
+
+        # Integrate undosed up to a first dose swept past the start of the output
+        if spec.time[0] < dose_times[0]:
+            dose_times = np.insert(dose_times, 0, spec.time[0])
+            dose_amounts = np.insert(dose_amounts, 0, 0.0, axis=1)
+        return dose_amounts, dose_times
+
+    def integrate(self, spec, dose_amounts, dose_times):
+        """Integrates through the dose schedule and returns the selections at the output times."""
+        rr = self.rr
+        all_results_segments = []
+        for cycle, (start, outputs, end) in enumerate(split_times(dose_times, spec.time)):
+            for index, id in enumerate(spec.dose_ids):
+                rr[f'{id}'] += dose_amounts[index][cycle]
+
+            first = 0 if outputs.size and outputs[0] == start else 1
+            times = np.concatenate([[start][:first], outputs, [] if end is None else [end]])
+            if len(times) > 1:
+                result_segment = rr.simulate(times=times)
+            else:
+                result_segment = np.array([[rr[sid] for sid in spec.ids_to_return]])
+            all_results_segments.append(result_segment[first:first + len(outputs), :])
+        return np.concatenate(all_results_segments)
+
+    def run(self, spec, targets, values, profile=None):
+        """
+        Simulates one sweep point.
+
+        Args:
+            spec (SimulationSpec): Simulation shared by all points
+            targets (list): SweepTarget of each swept column, or None
+            values: Swept values of the point
+            profile (PointProfile): Profile to record phase timings to, or None.
+                Failed points are recorded in the profile and return NaN
+                instead of raising, as with spec.nan_on_failure.
+
+        Returns:
+            TAC, or (TAC, PARAMS) with output parameters
+        """
+        clock = time.perf_counter()
+        try:
+            dose_amounts, dose_times = self.apply_point(spec, targets, values)
+            set_clock = time.perf_counter()
+            result = self.integrate(spec, dose_amounts, dose_times)
+            integrate_clock = time.perf_counter()
+        except RuntimeError as error:
+            if profile is None and not spec.nan_on_failure:
+                raise
+            if profile is not None:
+                profile.phases["integrate"] = time.perf_counter() - clock
+                profile.failed = True
+                profile.error = str(error)
+            result = np.full((len(spec.time), len(spec.ids_to_return)), np.nan)
+            integrate_clock = None
+
+        TAC = (result @ spec.masks.T * spec.nmol2mbq).astype(spec.dtype, copy=False)
+        if profile is not None and integrate_clock is not None:
+            profile.phases.update(set_values=set_clock - clock, integrate=integrate_clock - set_clock,
+                                  project=time.perf_counter() - integrate_clock)
+
+        if spec.n_output_parameters:
+            PARAMS = result[:,-spec.n_output_parameters:].astype(spec.dtype)
+            return TAC, PARAMS
+        return TAC
+
+
+def load_roadrunner(sbml_string, cache=None):
+    """
+    Compiles an SBML document with RoadRunner, reusing compiled state from cache.
+
+    Args:
+        sbml_string (str): SBML document
+        cache (ModelCache): On-disk cache of compiled models, or None
+    """
+    if cache is None:
+        return roadrunner.RoadRunner(sbml_string)
+
+    key = cache.key(sbml_string, f"roadrunner-{roadrunner.__version__}")
+    path = cache.get(key, ".rr")
+    if path is not None:
+        rr = roadrunner.RoadRunner()
+        try:
+            rr.loadStateS(path.read_bytes())
+            return rr
+        except (RuntimeError, OSError):
+            cache.invalidate(key)
+
+    rr = roadrunner.RoadRunner(sbml_string)
+    cache.put(key, ".rr", rr.saveStateS())
+    return rr
+
+
+def get_compiled_model(spec):
+    """Returns the compiled model for spec, compiling it on first use in this thread."""
+    compiled_models = getattr(_local, "compiled_models", None)
+    if compiled_models is None:
+        compiled_models = _local.compiled_models = {}
+    compiled = compiled_models.pop(spec.key, None)
+    if compiled is None:
+        if len(compiled_models) >= _MAX_COMPILED_MODELS:
+            compiled_models.pop(next(iter(compiled_models)))
+        compiled = CompiledModel(spec.sbml_string, spec.cache)
+    compiled_models[spec.key] = compiled
+    return compiled
+
+
+def simulate_chunk(spec, targets, chunk, profile=False):
+    """
+    Runs a chunk of sweep points.
+
+    Args:
+        spec (SimulationSpec or SharedInput): Simulation shared by all points
+        profile (bool): Record a PointProfile of each point
+
+    Returns:
+        (results, elapsed seconds, start and end wall clock times, PointProfile of each point or None)
+    """
+    wall_start = time.time()
+    start = time.perf_counter()
+    if isinstance(spec, SharedInput):
+        spec = spec.get()
+    load_clock = time.perf_counter()
+    compiled = get_compiled_model(spec)
+    compile_clock = time.perf_counter()
+
+    if not profile:
+        results = [compiled.run(spec, targets, values) for values in chunk]
+        return results, time.perf_counter() - start, (wall_start, time.time()), None
+
+    profiles = [PointProfile(worker=os.getpid()) for _ in chunk]
+    results = [compiled.run(spec, targets, values, point_profile)
+               for values, point_profile in zip(chunk, profiles)]
+    for point_profile in profiles:
+        point_profile.phases.update(load=(load_clock - start) / len(chunk),
+                                    compile=(compile_clock - load_clock) / len(chunk))
+    return results, time.perf_counter() - start, (wall_start, time.time()), profiles
+
+
+def iter_sweep(spec, targets, points, indices=None, disable_progress_bar=False,
+               max_workers=None, max_chunksize=None, executor="process", profile=None):
+    """
+    Runs sweep points on an executor, yielding chunks as they complete.
+
+    The first chunks hold one point each. Later chunks are sized from the
+    measured time per point so that each takes about TARGET_CHUNK_SECONDS,
+    while keeping enough chunks for all workers. Points are only taken from
+    points as their chunk is submitted.
+
+    Args:
+        spec (SimulationSpec): Simulation shared by all points
+        targets (list): SweepTarget of each swept column, or None
+        points: Swept values for each point, see take_points
+        indices (list): Indices of points to run, defaults to all
+        disable_progress_bar (bool): Hide the progress bar
+        max_workers (int): Number of workers
+        max_chunksize (int): Maximum number of points sent to a worker at once
+        executor: "serial", "thread", "process" or a concurrent.futures.Executor, see get_executor
+        profile (Profile): Profile to add a PointProfile of each point to, or None
+
+    Yields:
+        (indices, results) of each completed chunk.
+    """
+    indices = np.arange(len(points)) if indices is None else np.asarray(indices, dtype=int)
+    if not len(indices):
+        return
+
+    pool, n_workers, in_process = get_executor(executor, max_workers)
+    shared_spec = spec if in_process else SharedInput(spec)
+    max_size = max(1, math.ceil(len(indices) / (4 * n_workers)))
+    if max_chunksize:
+        max_size = min(max_size, max_chunksize)
+
+    position = 0
+    seconds_per_point = None
+    futures = {}
+    try:
+        with tqdm(total=len(indices), disable=disable_progress_bar) as progress_bar:
+            while position < len(indices) or futures:
+                while position < len(indices) and len(futures) < 2 * n_workers:
+                    size = 1 if seconds_per_point is None else \
+                        int(np.clip(TARGET_CHUNK_SECONDS / max(seconds_per_point, 1e-9), 1, max_size))
+                    chunk = indices[position:position + size]
+                    position += len(chunk)
+                    submitted = time.time()
+                    futures[pool.submit(simulate_chunk, shared_spec, targets, take_points(points, chunk),
+                                        profile is not None)] = chunk, submitted
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk, submitted = futures.pop(future)
+                    results, elapsed, (started, finished), point_profiles = future.result()
+                    if point_profiles is not None:
+                        # Time from submission to the start of the chunk, and from its end
+                        # to its results arriving here, covers pickling and transfer
+                        received = time.time()
+                        for point_profile in point_profiles if not in_process else ():
+                            point_profile.phases.update(queue=max(started - submitted, 0.0) / len(chunk),
+                                                        receive=max(received - finished, 0.0) / len(chunk))
+                        profile.add_points(chunk, point_profiles)
+                    chunk_seconds = elapsed / len(chunk)
+                    seconds_per_point = chunk_seconds if seconds_per_point is None else \
+                        0.5 * (seconds_per_point + chunk_seconds)
+                    yield chunk, results
+                    progress_bar.update(len(chunk))
+    except BrokenProcessPool:
+        if executor == "process":
+            shutdown_workers("process")
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def get_math_names(node):
+    names = []
+    if node.getType() == libsbml.AST_NAME:
+        names.append(node.getName())
+    for i in range(node.getNumChildren()):
+        names.extend(get_math_names(node.getChild(i)))
+    return names
+
+
+def get_dependents(assignments):
+    """Returns the symbols of initial assignments reading each name."""
+    dependents = {}
+    for symbol, node in assignments.items():
+        for name in get_math_names(node):
+            dependents.setdefault(name, set()).add(symbol)
+    return dependents
+
+
+def get_affected(dependents, ids):
+    """Returns the symbols of initial assignments depending, directly or not, on ids."""
+    affected = set()
+    stack = list(ids)
+    while stack:
+        for symbol in dependents.get(stack.pop(), ()):
+            if symbol not in affected:
+                affected.add(symbol)
+                stack.append(symbol)
+    return affected
+
+
+def sort_assignments(assignments):
+    """Orders initial assignment symbols so that dependencies come first."""
+    order = []
+    visited = set()
+
+    def visit(symbol):
+        if symbol in visited:
+            return
+        visited.add(symbol)
+        for name in get_math_names(assignments[symbol]):
+            if name in assignments:
+                visit(name)
+        order.append(symbol)
+
+    for symbol in assignments:
+        visit(symbol)
+    return order
+
+
+def evaluate_math(node, values, functions=math):
+    """
+    Evaluates an SBML math expression.
+
+    Args:
+        node (libsbml.ASTNode): Expression
+        values (dict): Values of named elements
+        functions: Module providing sqrt, exp, log and log10, math for floats
+            or jax.numpy to evaluate inside traced jax code
+    """
+    node_type = node.getType()
+    if node_type == libsbml.AST_NAME:
+        return values[node.getName()]
+    if node_type == libsbml.AST_INTEGER:
+        return float(node.getInteger())
+    if node_type in (libsbml.AST_REAL, libsbml.AST_REAL_E, libsbml.AST_RATIONAL):
+        return node.getReal()
+    if node_type == libsbml.AST_CONSTANT_PI:
+        return math.pi
+    if node_type == libsbml.AST_CONSTANT_E:
+        return math.e
+
+    args = [evaluate_math(node.getChild(i), values, functions) for i in range(node.getNumChildren())]
+    if node_type == libsbml.AST_PLUS:
+        return sum(args)
+    if node_type == libsbml.AST_MINUS:
+        return -args[0] if len(args) == 1 else args[0] - args[1]
+    if node_type == libsbml.AST_TIMES:
+        return math.prod(args)
+    if node_type == libsbml.AST_DIVIDE:
+        return args[0] / args[1]
+    if node_type in (libsbml.AST_POWER, libsbml.AST_FUNCTION_POWER):
+        return args[0] ** args[1]
+    if node_type == libsbml.AST_FUNCTION_ROOT:
+        return functions.sqrt(args[0]) if len(args) == 1 else args[1] ** (1 / args[0])
+    if node_type == libsbml.AST_FUNCTION_EXP:
+        return functions.exp(args[0])
+    if node_type == libsbml.AST_FUNCTION_LN:
+        return functions.log(args[0])
+    if node_type == libsbml.AST_FUNCTION_LOG:
+        return functions.log10(args[0]) if len(args) == 1 else functions.log(args[1]) / functions.log(args[0])
+    if node_type == libsbml.AST_FUNCTION_ABS:
+        return abs(args[0])
+    raise NotImplementedError(f"Initial assignment {libsbml.formulaToL3String(node)} is not supported in sweeps.")
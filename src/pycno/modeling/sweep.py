@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class SweepTarget():
+    """
+    Where one column of swept values is applied.
+
+    Args:
+        kind (str): "element" for a parameter or compartment volume,
+            "dose" for a dose amount or "time" for a dose time
+        id (str): Element id, for "element"
+        target (int): Index of the dose target, for "dose"
+        cycle (int): Dose cycle, or None for every cycle of a dose amount
+    """
+    kind: str
+    id: str = None
+    target: int = None
+    cycle: int = None
+
+
+def apply_point(targets, values, dose_amounts, dose_times):
+    """
+    Splits the swept values of one point by target.
+
+    Args:
+        targets (list): SweepTarget of each column, or None
+        values (list): Swept values of the point
+        dose_amounts (np.ndarray): Dose amounts [n_targets, n_cycles]
+        dose_times (np.ndarray): Dose times
+
+    Returns:
+        (element_ids, element_values, dose_amounts, dose_times) for the point
+    """
+    element_ids, element_values = [], []
+    if not targets:
+        return element_ids, element_values, dose_amounts, dose_times
+
+    dose_amounts = np.array(dose_amounts, dtype=float)
+    dose_times = np.array(dose_times, dtype=float)
+    for target, value in zip(targets, values):
+        if target.kind == "element":
+            element_ids.append(target.id)
+            element_values.append(float(value))
+        elif target.kind == "dose":
+            cycles = slice(None) if target.cycle is None else target.cycle
+            dose_amounts[target.target, cycles] = value
+        elif target.kind == "time":
+            dose_times[target.cycle] = value
+        else:
+            raise ValueError(f"Unknown sweep target {target.kind}.")
+    return element_ids, element_values, dose_amounts, dose_times
+
+
+def take_points(points, indices):
+    """
+    Returns the sweep points at indices.
+
+    Lists of points are indexed one by one, while arrays and cohorts return
+    the rows of all indices at once without building per point objects.
+
+    Args:
+        points: List of points, array [n_points, n_swept] or Cohort
+        indices (list): Point indices
+    """
+    if isinstance(points, (list, tuple)):
+        return [points[i] for i in indices]
+    return points[np.asarray(indices, dtype=int)]
+
+
+def split_times(dose_times, ts):
+    """
+    Splits output times into dose cycles.
+
+    Each cycle is integrated from its dose time to the next dose time and
+    outputs the times falling in between. Cycles after the last output time
+    are dropped.
+
+    Args:
+        dose_times (list): Sorted dose times
+        ts (np.ndarray): Sorted output times
+
+    Returns:
+        List of (start, outputs, end) per cycle, where end is the next dose
+        time or None for the last integrated cycle.
+    """
+    dose_times = np.asarray(dose_times, dtype=float)
+    ts = np.asarray(ts, dtype=float)
+    if np.any(np.diff(dose_times) < 0):
+        raise ValueError("Dose times must be in increasing order.")
+    if ts.size and ts[0] < dose_times[0]:
+        raise ValueError("Output times must not precede the first dose.")
+
+    segments = []
+    for cycle, start in enumerate(dose_times):
+        if cycle + 1 < len(dose_times) and ts.size and ts[-1] >= dose_times[cycle + 1]:
+            end = dose_times[cycle + 1]
+            segments.append((start, ts[(ts >= start) & (ts < end)], end))
+        else:
+            segments.append((start, ts[ts >= start], None))
+            break
+    return segments
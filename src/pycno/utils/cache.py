@@ -0,0 +1,240 @@
+import hashlib
+import io
+import os
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "pycno"
+DEFAULT_RESULT_CACHE_DIR = Path.home() / ".cache" / "pycno-results"
+DEFAULT_MAX_SIZE = 2 * 1024**3
+
+# Suffixes of the files a cache writes, the only files it evicts or removes
+ENTRY_SUFFIXES = (".rr", ".py", ".npz")
+TEMPORARY_SUFFIX = ".tmp"
+
+
+class ModelCache():
+    """
+    On-disk cache of compiled models, keyed by a hash of the SBML document and backend.
+
+    Entries are evicted least recently used first once the cache exceeds max_size.
+    Only files the cache writes, directly in its directory, are ever removed,
+    so the directory may be shared with other files.
+
+    Args:
+        directory (str): Cache directory, defaults to $PYCNO_CACHE_DIR or ~/.cache/pycno
+        max_size (int): Maximum total size of cached files in bytes
+    """
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = Path(directory or os.environ.get("PYCNO_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.max_size = max_size
+
+    @staticmethod
+    def key(sbml_string, backend):
+        """
+        Returns the cache key of an SBML document compiled for a backend.
+
+        Args:
+            sbml_string (str): SBML document
+            backend (str): Backend name, including its version
+        """
+        digest = hashlib.sha256()
+        digest.update(backend.encode())
+        digest.update(b"\0")
+        digest.update(sbml_string.encode())
+        return digest.hexdigest()
+
+    def path(self, key, suffix):
+        return self.directory / f"{key}{suffix}"
+
+    def get(self, key, suffix):
+        """
+        Returns the path of a cached entry, or None if it is not cached.
+
+        Args:
+            key (str): Cache key
+            suffix (str): File suffix of the entry
+        """
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, suffix, data, evict=True):
+        """
+        Stores an entry and evicts old entries if the cache is full.
+
+        Args:
+            key (str): Cache key
+            suffix (str): File suffix of the entry
+            data (bytes): Entry contents
+            evict (bool): Evict now, or leave it to a later call of evict
+
+        Returns:
+            Path of the cached entry.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path(key, suffix)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=TEMPORARY_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if evict:
+            self.evict()
+        return path
+
+    def get_entries(self, suffixes=ENTRY_SUFFIXES):
+        """Returns the files of the cache with one of suffixes."""
+        if not self.directory.is_dir():
+            return []
+        return [path for path in self.directory.iterdir() if path.suffix in suffixes and path.is_file()]
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_size."""
+        entries = []
+        for path in self.get_entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+    def invalidate(self, key=None):
+        """
+        Removes cached entries.
+
+        Args:
+            key (str): Cache key to remove, or None to remove every entry and
+                leftover temporary file of the cache
+        """
+        if key is not None:
+            for suffix in ENTRY_SUFFIXES:
+                self.path(key, suffix).unlink(missing_ok=True)
+            return
+        for path in self.get_entries(ENTRY_SUFFIXES + (TEMPORARY_SUFFIX,)):
+            path.unlink(missing_ok=True)
+
+
+class ResultCache():
+    """
+    Cache of per point simulation results, with an in-memory LRU tier and an on-disk tier.
+
+    Args:
+        max_entries (int): Number of results kept in memory
+        directory (str): Directory of the on-disk tier, defaults to
+            $PYCNO_RESULT_CACHE_DIR or ~/.cache/pycno-results
+        max_size (int): Maximum size of the on-disk tier in bytes, 0 to keep results in memory only
+    """
+    def __init__(self, max_entries=1024, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.disk = None
+        if max_size:
+            directory = directory or os.environ.get("PYCNO_RESULT_CACHE_DIR") or DEFAULT_RESULT_CACHE_DIR
+            self.disk = ModelCache(directory, max_size)
+
+    def get(self, key):
+        """
+        Returns the cached (TAC, PARAMS or None) of a point, or None on a miss.
+
+        Args:
+            key (str): Point key
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+        path = self.disk.get(key, ".npz") if self.disk else None
+        if path is None:
+            return None
+        try:
+            with np.load(path) as arrays:
+                result = (arrays["TAC"], arrays["PARAMS"] if "PARAMS" in arrays else None)
+        except (OSError, ValueError, KeyError):
+            return None
+        self.remember(key, result)
+        return result
+
+    def put(self, key, TAC, PARAMS=None, evict=True):
+        """
+        Stores the result of a point.
+
+        Args:
+            key (str): Point key
+            TAC (np.ndarray): TAC [n_times, n_regions]
+            PARAMS (np.ndarray): Parameters [n_times, n_parameters], or None
+            evict (bool): Evict the on-disk tier now, or leave it to a later call of evict
+        """
+        self.remember(key, (TAC, PARAMS))
+        if self.disk:
+            arrays = {"TAC": TAC} if PARAMS is None else {"TAC": TAC, "PARAMS": PARAMS}
+            buffer = io.BytesIO()
+            np.savez(buffer, **arrays)
+            self.disk.put(key, ".npz", buffer.getvalue(), evict=evict)
+
+    def remember(self, key, result):
+        self.memory[key] = result
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        """Evicts the on-disk tier down to its size limit."""
+        if self.disk:
+            self.disk.evict()
+
+    def clear(self):
+        """Removes all cached results."""
+        self.memory.clear()
+        if self.disk:
+            self.disk.invalidate()
+
+
+_default_cache = ModelCache()
+_result_cache = None
+
+
+def get_default_cache():
+    """Returns the cache used by Model, or None if caching is disabled."""
+    return _default_cache
+
+
+def set_default_cache(cache):
+    """
+    Sets the cache used by Model.
+
+    Args:
+        cache (ModelCache): Cache to use, or None to disable caching
+    """
+    global _default_cache
+    _default_cache = cache
+
+
+def get_result_cache():
+    """Returns the cache of simulation results, or None if results are not cached."""
+    return _result_cache
+
+
+def set_result_cache(cache):
+    """
+    Sets the cache of simulation results. Result caching is off by default.
+
+    Args:
+        cache (ResultCache): Cache to use, or None to disable result caching
+    """
+    global _result_cache
+    _result_cache = cache
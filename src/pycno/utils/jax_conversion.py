@@ -1,25 +1,35 @@
 import sbmltoodejax
 import inspect
 import tempfile
-import importlib
+import importlib.util
 import sys
 import os
 import xml.etree.ElementTree as ET
 from typing import Any, Tuple, List
 
-def convert_model_to_jax(model_string):
-    model_name = 'model_temp'
-    model = sbmltoodejax.parse.ParseSBMLFile(model_string)
+def convert_model_to_jax(model_string, cache=None):
+    """
+    Converts an SBML document to a jax rollout with sbmltoodejax.
 
-    with tempfile.TemporaryDirectory() as tmpdir:
-        module_file = os.path.join(tmpdir, f'{model_name}.py')
-        sbmltoodejax.modulegeneration.GenerateModel(model, module_file)
-        sys.path.insert(0, tmpdir)
-        try:
-            model_file = importlib.import_module(model_name)
-            rollout = model_file.ModelRollout
-        finally:
-            sys.path.pop(0)
+    Args:
+        model_string (str): SBML document
+        cache (ModelCache): On-disk cache for the generated module, or None
+
+    Returns:
+        (rollout, name_list_y, name_list_w, name_list_c, y0, c)
+    """
+    if cache is not None:
+        key = cache.key(model_string, f"sbmltoodejax-{getattr(sbmltoodejax, '__version__', '')}")
+        module_file = cache.get(key, '.py')
+        if module_file is None:
+            module_file = cache.put(key, '.py', generate_module(model_string).encode())
+        rollout = load_module(f'pycno_jax_{key[:16]}', module_file).ModelRollout
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            module_file = os.path.join(tmpdir, 'model_temp.py')
+            with open(module_file, 'w') as f:
+                f.write(generate_module(model_string))
+            rollout = load_module('model_temp', module_file).ModelRollout
     name_list_y, name_list_w, name_list_c = get_rollout_names(model_string, rollout())
 
     sig = inspect.signature(rollout.__call__)
@@ -28,6 +38,22 @@ def convert_model_to_jax(model_string):
 
     return rollout(), name_list_y, name_list_w, name_list_c, y0, c
 
+def generate_module(model_string):
+    """Returns the source of the sbmltoodejax module generated for an SBML document."""
+    model = sbmltoodejax.parse.ParseSBMLFile(model_string)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        module_file = os.path.join(tmpdir, 'model_temp.py')
+        sbmltoodejax.modulegeneration.GenerateModel(model, module_file)
+        with open(module_file) as f:
+            return f.read()
+
+def load_module(module_name, module_file):
+    spec = importlib.util.spec_from_file_location(module_name, module_file)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
 def get_rollout_names(model_string: str, rollout: Any) -> Tuple[List[str], List[str], List[str]]:
     """
     Parse an SBML file and map rollout IDs to human-readable names.
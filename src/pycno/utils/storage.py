@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+
+class SweepStore():
+    """
+    On-disk store of sweep results, written point by point as they complete.
+
+    Results are kept in memory-mapped .npy files in a directory together with
+    a record of completed points, so an interrupted sweep can be resumed.
+
+    Args:
+        path (str): Directory of the store
+        fingerprint (str): Hash identifying the simulation and its sweep points
+        n_points (int): Number of sweep points
+        n_times (int): Number of output times
+        n_regions (int): Number of output regions
+        n_parameters (int): Number of output parameters
+        dtype (str): Storage dtype of the results
+    """
+    def __init__(self, path, fingerprint, n_points, n_times, n_regions, n_parameters=0, dtype="<f8"):
+        self.path = Path(path)
+        self.n_parameters = n_parameters
+        meta = {"fingerprint": fingerprint, "n_points": n_points, "n_times": n_times,
+                "n_regions": n_regions, "n_parameters": n_parameters, "dtype": dtype}
+
+        meta_path = self.path / "meta.json"
+        if meta_path.exists():
+            with open(meta_path) as f:
+                existing = json.load(f)
+            if existing != meta:
+                raise ValueError(f"Results in {self.path} belong to a different simulation. "
+                                 "Remove them or choose another output_path.")
+            mode = "r+"
+        else:
+            self.path.mkdir(parents=True, exist_ok=True)
+            mode = "w+"
+
+        self.completed = np.lib.format.open_memmap(
+            self.path / "completed.npy", mode=mode, dtype=bool, shape=(n_points,))
+        self.TACs = np.lib.format.open_memmap(
+            self.path / "TACs.npy", mode=mode, dtype=dtype, shape=(n_points, n_times, n_regions))
+        if n_parameters:
+            self.PARAMS = np.lib.format.open_memmap(
+                self.path / "PARAMS.npy", mode=mode, dtype=dtype, shape=(n_points, n_times, n_parameters))
+
+        if mode == "w+":
+            # Written last, so a store without meta.json is never resumed
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def get_pending(self):
+        """Returns indices of points that have not completed yet."""
+        return np.flatnonzero(~self.completed)
+
+    def write(self, indices, TACs, PARAMS=None):
+        """
+        Writes results of completed points.
+
+        Args:
+            indices (list): Point indices
+            TACs (np.ndarray): TACs [n, n_times, n_regions]
+            PARAMS (np.ndarray): Parameters [n, n_times, n_parameters]
+        """
+        self.TACs[indices] = TACs
+        self.TACs.flush()
+        if self.n_parameters:
+            self.PARAMS[indices] = PARAMS
+            self.PARAMS.flush()
+        self.completed[indices] = True
+        self.completed.flush()
+
+    def load(self):
+        """
+        Returns read-only memory-mapped views of the results.
+
+        Returns:
+            (TACs, PARAMS or None)
+        """
+        TACs = np.load(self.path / "TACs.npy", mmap_mode="r")
+        if self.n_parameters:
+            return TACs, np.load(self.path / "PARAMS.npy", mmap_mode="r")
+        return TACs, None
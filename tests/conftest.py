@@ -0,0 +1,95 @@
+import libsbml
+import pytest
+
+from pycno import Dose, Model
+from pycno.utils import cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_caches(tmp_path, monkeypatch):
+    """Compiles models into a temporary cache and turns result caching off."""
+    monkeypatch.setattr(cache, "_default_cache", cache.ModelCache(tmp_path / "models"))
+    monkeypatch.setattr(cache, "_result_cache", None)
+
+
+@pytest.fixture
+def model():
+    return Model("reduced")
+
+
+@pytest.fixture
+def dose():
+    return Dose(times=[0], targets={"Blood.Hot": [1.0], "Blood.Cold": [10.0]})
+
+
+@pytest.fixture
+def simulate_kwargs():
+    return dict(stop=60, steps=20, output_compartments=["Tumor1", "Kidney"],
+                disable_progress_bar=True, executor="serial")
+
+
+@pytest.fixture
+def make_model(tmp_path):
+    """
+    Returns a function building a small model as a Model.
+
+    Hot ligand moves from Blood to Tumor1 at k_in and back at k_out = k_in / 2,
+    and is cleared from Blood at k_el.
+    """
+    def make(only_substance_units=True, volumes=(5.0, 0.1)):
+        document = libsbml.SBMLDocument(3, 2)
+        sbml_model = document.createModel()
+        for name, size in zip(("Blood", "Tumor1"), volumes):
+            compartment = sbml_model.createCompartment()
+            compartment.setId(name)
+            compartment.setName(name)
+            compartment.setSize(size)
+            compartment.setConstant(True)
+            species = sbml_model.createSpecies()
+            species.setId(f"Hot{name}")
+            species.setName("Hot")
+            species.setCompartment(name)
+            species.setInitialAmount(0.0)
+            species.setHasOnlySubstanceUnits(only_substance_units)
+            species.setBoundaryCondition(False)
+            species.setConstant(False)
+        for name, value in (("lambdaPhys", 7.2e-5), ("k_in", 0.02), ("k_out", 0.01), ("k_el", 0.005)):
+            parameter = sbml_model.createParameter()
+            parameter.setId(name)
+            parameter.setName(name)
+            parameter.setValue(value)
+            parameter.setConstant(True)
+        sbml_model.createInitialAssignment().setSymbol("k_out")
+        sbml_model.getInitialAssignment("k_out").setMath(libsbml.parseL3Formula("k_in / 2"))
+        # Rates of amounts, whether species are amounts or concentrations
+        for name, source, target, rate in (("uptake", "HotBlood", "HotTumor1", "k_in * HotBlood"),
+                                           ("release", "HotTumor1", "HotBlood", "k_out * HotTumor1"),
+                                           ("clearance", "HotBlood", None, "k_el * HotBlood")):
+            reaction = sbml_model.createReaction()
+            reaction.setId(name)
+            reaction.setReversible(False)
+            for species_id, create in ((source, reaction.createReactant), (target, reaction.createProduct)):
+                if species_id is not None:
+                    reference = create()
+                    reference.setSpecies(species_id)
+                    reference.setStoichiometry(1.0)
+                    reference.setConstant(True)
+            if not only_substance_units:
+                rate = f"{rate} * {source[3:]}"
+            reaction.createKineticLaw().setMath(libsbml.parseL3Formula(rate))
+        path = tmp_path / f"small-{only_substance_units}-{'-'.join(map(str, volumes))}.sbml"
+        libsbml.writeSBMLToFile(document, str(path))
+        return Model(str(path))
+
+    return make
+
+
+@pytest.fixture
+def jax_model(model):
+    """Converts the model to jax, skipping the test where the installed sbmltoodejax cannot convert it."""
+    jax = pytest.importorskip("jax")
+    jax.config.update("jax_enable_x64", True)
+    try:
+        return model.get_jax_model()
+    except Exception as error:
+        pytest.skip(f"sbmltoodejax cannot convert {model.model_name}: {error!r}")
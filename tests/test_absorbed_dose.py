@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from pycno import Dose
+
+REGIONS = ["Blood", "Tumor1"]
+STOP = 600.0
+
+
+@pytest.fixture
+def dose():
+    return Dose(times=[0, 240], targets={"Blood.Hot": [1.0, 0.5]})
+
+
+@pytest.mark.parametrize("only_substance_units", [True, False])
+def test_cumulated_activity_integrates_tacs(make_model, dose, only_substance_units):
+    model = make_model(only_substance_units)
+    TIA = model.simulate_absorbed_dose(dose, STOP, REGIONS, executor="serial")
+
+    times = np.linspace(0, STOP, 6001)
+    _, TACs = model.simulate(dose, times=times, output_compartments=REGIONS, executor="serial",
+                             disable_progress_bar=True)
+    # Trapezoids over MBq min, in MBq h
+    expected = np.sum((TACs[0, 1:] + TACs[0, :-1]) / 2 * np.diff(times)[:, None], axis=0) / 60
+    np.testing.assert_allclose(TIA[0], expected, rtol=1e-3)
+
+
+def test_absorbed_dose_applies_s_values(make_model, dose):
+    model = make_model()
+    s_values = np.array([[0.1, 0.0], [0.01, 2.0]])
+    TIA, absorbed = model.simulate_absorbed_dose(dose, STOP, REGIONS, s_values, executor="serial")
+    np.testing.assert_allclose(absorbed, TIA @ s_values.T)
+    _, self_dose = model.simulate_absorbed_dose(dose, STOP, REGIONS, np.array([0.1, 2.0]), executor="serial")
+    np.testing.assert_allclose(self_dose, TIA * [0.1, 2.0])
+
+
+def test_swept_volumes_scale_concentration_species(make_model, dose):
+    model = make_model(only_substance_units=False)
+    TIA = model.simulate_absorbed_dose(dose, STOP, REGIONS, swept_parameters=["Tumor1"],
+                                       swept_values=[[0.1], [0.2]], executor="serial")
+    expected = make_model(only_substance_units=False, volumes=(5.0, 0.2)).simulate_absorbed_dose(
+        dose, STOP, REGIONS, executor="serial")
+    np.testing.assert_allclose(TIA[1], expected[0], rtol=1e-8)
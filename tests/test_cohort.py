@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from scipy import stats
+
+from pycno import Cohort
+from pycno.modeling.cohort import permute
+
+DISTRIBUTIONS = {"k_off": stats.lognorm(0.2, scale=0.01), "Tumor1": stats.uniform(0.05, 0.1)}
+
+
+@pytest.mark.parametrize("method", ["lhs", "sobol", "random"])
+def test_scattered_patients_match_the_full_cohort(method):
+    cohort = Cohort(DISTRIBUTIONS, 1000, method=method, seed=3)
+    patients = cohort[:]
+    indices = np.array([999, 3, 4, 5, 17, 3, 512, 0, -1])
+    np.testing.assert_array_equal(cohort[indices], patients[indices])
+    np.testing.assert_array_equal(cohort[7], patients[7])
+    with pytest.raises(IndexError):
+        cohort[[1000]]
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 17, 100, 1000, 4097])
+def test_permute_is_a_bijection(n):
+    images = permute(np.arange(n), n, [0, 0, 1])
+    np.testing.assert_array_equal(np.sort(images), np.arange(n))
+
+
+def test_lhs_hits_each_stratum_once():
+    cohort = Cohort({"a": stats.uniform(), "b": stats.uniform(), "c": stats.uniform()}, 1000, seed=5)
+    strata = np.floor(cohort[:] * len(cohort)).astype(int)
+    for column in strata.T:
+        np.testing.assert_array_equal(np.sort(column), np.arange(len(cohort)))
+
+
+def test_chunks_equal_the_full_cohort():
+    cohort = Cohort(DISTRIBUTIONS, 1000, seed=1)
+    chunks = list(cohort.iter_chunks(300))
+    np.testing.assert_array_equal(np.concatenate([indices for indices, _ in chunks]), np.arange(1000))
+    np.testing.assert_array_equal(np.concatenate([values for _, values in chunks]), cohort[:])
+
+
+def test_correlation_is_applied():
+    correlation = np.array([[1.0, 0.8], [0.8, 1.0]])
+    cohort = Cohort(DISTRIBUTIONS, 4000, correlation=correlation, seed=2)
+    assert stats.spearmanr(cohort[:]).statistic == pytest.approx(0.8, abs=0.05)
+
+
+def test_fingerprint_is_stable_across_sessions():
+    script = ("from scipy import stats; from pycno import Cohort; "
+              "print(Cohort({'k_off': stats.lognorm(0.2, scale=0.01)}, 10, seed=4).fingerprint())")
+    outputs = {subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                              env={**os.environ, "PYTHONHASHSEED": str(seed),
+                                   "PYTHONPATH": os.pathsep.join(sys.path)}).stdout.strip()
+               for seed in (1, 2)}
+    assert outputs == {Cohort({"k_off": stats.lognorm(0.2, scale=0.01)}, 10, seed=4).fingerprint()}
+    assert Cohort(DISTRIBUTIONS, 10, seed=4).fingerprint() != Cohort(DISTRIBUTIONS, 10, seed=5).fingerprint()
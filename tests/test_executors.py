@@ -0,0 +1,34 @@
+import pickle
+
+import pytest
+
+from pycno.modeling import executors
+from pycno.modeling.executors import SharedInput
+
+
+@pytest.fixture
+def shared_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(executors, "_shared_inputs", {})
+    monkeypatch.setattr(executors, "_shared_directory", tmp_path)
+    return tmp_path
+
+
+def test_shared_inputs_are_evicted_with_their_files(shared_directory):
+    handles = [SharedInput({"patient": i}) for i in range(executors._MAX_SHARED_INPUTS + 3)]
+
+    assert len(executors._shared_inputs) == executors._MAX_SHARED_INPUTS
+    assert sorted(shared_directory.glob("*.pkl")) == sorted(h.path for h in handles[3:])
+
+    # A worker process loads the newest inputs from their files
+    executors._shared_inputs.clear()
+    assert pickle.loads(pickle.dumps(handles[-1])).get() == {"patient": len(handles) - 1}
+
+
+def test_recreated_shared_input_is_kept(shared_directory):
+    first = SharedInput("first")
+    for i in range(executors._MAX_SHARED_INPUTS - 1):
+        SharedInput(i)
+    SharedInput("first")
+    SharedInput("last")
+    assert first.path.exists()
+    assert first.get() == "first"
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from pycno import Dose
+from pycno.modeling.fitting import to_bounded, to_unbounded
+
+REGIONS = ["Blood", "Tumor1"]
+TIMES = [5.0, 30.0, 60.0, 120.0, 240.0]
+
+
+@pytest.fixture
+def model(make_model):
+    return make_model()
+
+
+@pytest.fixture
+def dose():
+    return Dose(times=[0], targets={"Blood.Hot": [1.0]})
+
+
+def test_bounds_transform_round_trips():
+    lower = np.array([0.0, -np.inf, 1.0, -np.inf])
+    upper = np.array([np.inf, 2.0, 3.0, np.inf])
+    values = np.array([0.5, 1.5, 2.9, -4.0])
+    np.testing.assert_allclose(to_bounded(to_unbounded(values, lower, upper), lower, upper), values)
+    with pytest.raises(ValueError, match="strictly within their bounds"):
+        to_unbounded(values, lower, np.array([np.inf, 1.0, 3.0, np.inf]))
+
+
+def test_fit_recovers_known_parameters(model, dose, jax_model):
+    true_values = np.array([[0.04], [0.01]])
+    _, data = model.simulate(dose, times=TIMES, output_compartments=REGIONS, swept_parameters=["k_in"],
+                             swept_values=true_values, disable_progress_bar=True, executor="serial")
+    # The second patient missed the last scan
+    data[1, -1] = np.nan
+
+    result = model.fit(dose, TIMES, data, REGIONS, ["k_in"])
+
+    np.testing.assert_allclose(result.values, true_values, rtol=1e-2)
+    np.testing.assert_allclose(result.TACs[0], data[0], rtol=1e-2)
+    assert np.all(np.isfinite(result.standard_errors))
+
+
+def test_prior_pulls_fits_towards_its_mean(model, dose, jax_model):
+    _, data = model.simulate(dose, times=TIMES, output_compartments=REGIONS, swept_parameters=["k_in"],
+                             swept_values=[[0.04]], disable_progress_bar=True, executor="serial")
+    free = model.fit(dose, TIMES, data[0], REGIONS, ["k_in"])
+    informed = model.fit(dose, TIMES, data[0], REGIONS, ["k_in"], prior={"k_in": (0.02, 0.001)})
+    assert abs(informed.values[0, 0] - 0.02) < abs(free.values[0, 0] - 0.02)
+    assert informed.standard_errors[0, 0] < free.standard_errors[0, 0]
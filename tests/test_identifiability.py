@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from pycno.modeling.identifiability import FisherInformation, get_design_weights
+
+
+def test_design_weights_count_the_scans_of_each_schedule():
+    weights = get_design_weights([60.0, 240.0, 1440.0], [[60.0, 1440.0], [240.0, 240.0]])
+    np.testing.assert_array_equal(weights, [[1, 0, 1], [0, 2, 0]])
+    with pytest.raises(ValueError, match="not one of the candidate times"):
+        get_design_weights([60.0, 240.0], [[120.0]])
+
+
+def test_fisher_information_of_schedules():
+    # Two parameters seen by two times, one region with 10% noise on a unit TAC
+    jacobian = np.array([[[1.0, 0.0]], [[1.0, 1.0]]])
+    TACs = np.ones((2, 1))
+    weights = np.array([[1, 1], [0, 1], [0, 4]])
+    info = FisherInformation.from_jacobian(["a", "b"], [1.0, 2.0], jacobian, TACs, weights)
+
+    np.testing.assert_allclose(info.fim[0], [[200, 100], [100, 100]])
+    np.testing.assert_allclose(info.standard_errors[0], np.sqrt(np.diag(np.linalg.inv(info.fim[0]))))
+    np.testing.assert_allclose(info.correlation[0, 0, 1], -1 / np.sqrt(2))
+
+    # One time cannot separate the parameters, however often it is scanned
+    assert np.all(np.isinf(info.standard_errors[1:]))
+    assert np.all(info.d_optimality[1:] == -np.inf)
+    assert info.rank()[0] == 0
+
+
+def test_standard_error_matches_finite_differences(model, dose, jax_model):
+    info = model.compute_fim(dose, [30.0], ["Tumor1"], ["k_off"], relative_noise=0.1)
+
+    k_off = dict(model.get_parameters())["k_off"]
+    _, TACs = model.simulate(dose, times=[30.0], output_compartments=["Tumor1"], swept_parameters=["k_off"],
+                             swept_values=[[1.01 * k_off], [0.99 * k_off]], disable_progress_bar=True,
+                             executor="serial")
+    sensitivity = (TACs[0, -1, 0] - TACs[1, -1, 0]) / (0.02 * TACs[:, -1, 0].mean())
+    np.testing.assert_allclose(info.standard_errors[0, 0], 0.1 / abs(sensitivity), rtol=0.05)
+
+
+def test_more_scans_are_more_informative(model, dose, jax_model):
+    times = [10.0, 30.0, 60.0]
+    info = model.compute_fim(dose, times, ["Tumor1", "Kidney"], ["k_off", "Tumor1"],
+                             schedules=[[10.0, 30.0, 60.0], [10.0, 60.0], [60.0]])
+    assert np.all(np.diff(info.d_optimality) < 0)
+    assert np.all(info.standard_errors[0] <= info.standard_errors[1])
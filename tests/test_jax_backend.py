@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+
+def test_region_masks_select_the_hot_species_of_each_region(model, jax_model):
+    regions = ["Tumor1", "Kidney", "Tumor1+Kidney"]
+    masks = np.asarray(model.get_region_masks(regions, jax_model))
+
+    assert masks.shape == (len(regions), len(jax_model.y0))
+    for region, mask in zip(regions, masks):
+        expected = {sid for term in region.split("+") for sid in model.index.get_region_species(term, "Hot")}
+        assert expected
+        assert {sid for sid, j in jax_model.y_indexes.items() if mask[j]} == expected
+
+
+def test_region_masks_reject_regions_without_hot_species(model, jax_model):
+    with pytest.raises(ValueError, match="No hot species found for region 'Nowhere'"):
+        model.get_region_masks(["Tumor1", "Nowhere"], jax_model)
+
+
+def test_sensitivities_match_finite_differences(model, dose, jax_model):
+    regions = ["Tumor1", "Kidney"]
+    sensitivities = model.compute_sensitivities(dose, 30.0, regions, normalize=False)
+
+    k_off = dict(model.get_parameters())["k_off"]
+    _, TACs = model.simulate(dose, times=[30.0], output_compartments=regions, swept_parameters=["k_off"],
+                             swept_values=[[1.01 * k_off], [0.99 * k_off]], disable_progress_bar=True,
+                             executor="serial")
+    expected = (TACs[0, -1] - TACs[1, -1]) / (0.02 * TACs[:, -1].mean(axis=0))
+    np.testing.assert_allclose(sensitivities.loc["k_off", regions], expected, rtol=0.05, atol=1e-3)
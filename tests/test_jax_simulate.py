@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from pycno import Dose
+
+REGIONS = ["Blood", "Tumor1"]
+
+
+@pytest.fixture
+def model(make_model):
+    return make_model(only_substance_units=False)
+
+
+def simulate_both(model, dose, **kwargs):
+    kwargs = dict(output_compartments=REGIONS, disable_progress_bar=True, executor="serial", **kwargs)
+    time, expected = model.simulate(dose, **kwargs)
+    jax_time, TACs = model.simulate(dose, backend="jax", **kwargs)
+    np.testing.assert_array_equal(jax_time, time)
+    return TACs, expected
+
+
+def test_sparse_times_match_roadrunner(model, jax_model):
+    dose = Dose(times=[0], targets={"Blood.Hot": [1.0]})
+
+    TACs, expected = simulate_both(model, dose, times=[0.0, 0.5, 7.0, 60.0, 600.0])
+
+    np.testing.assert_allclose(TACs, expected, rtol=1e-2, atol=1e-9)
+
+
+def test_times_before_the_first_dose_match_roadrunner(model, jax_model):
+    dose = Dose(times=[30], targets={"Blood.Hot": [1.0]})
+
+    TACs, expected = simulate_both(model, dose, times=[0.0, 10.0, 30.0, 45.0, 120.0])
+
+    np.testing.assert_array_equal(TACs[:, :2], 0.0)
+    assert (TACs[:, 2:, 0] > 0).all()
+    np.testing.assert_allclose(TACs, expected, rtol=1e-2, atol=1e-9)
+
+
+def test_parameter_sweeps_match_roadrunner(model, jax_model):
+    dose = Dose(times=[0], targets={"Blood.Hot": [1.0]})
+    points = [[0.01, 0.001], [0.02, 0.005], [0.04, 0.01]]
+
+    TACs, expected = simulate_both(model, dose, stop=240, steps=24, swept_parameters=["k_in", "k_el"],
+                                   swept_values=points)
+
+    assert TACs.shape == (len(points), 24, len(REGIONS))
+    np.testing.assert_allclose(TACs, expected, rtol=1e-2, atol=1e-9)
+    assert len(np.unique(TACs[:, -1, 1])) == len(points)
+
+
+def test_multi_cycle_doses_match_roadrunner(model, jax_model):
+    dose = Dose(times=[0, 60, 180], targets={"Blood.Hot": [1.0, 0.5, 2.0]})
+    # Output times on, between and after the dose times
+    times = [0.0, 30.0, 60.0, 90.0, 180.0, 181.0, 400.0]
+
+    TACs, expected = simulate_both(model, dose, times=times, swept_parameters=["Blood.Hot[1]"],
+                                   swept_values=[[0.5], [4.0]])
+
+    np.testing.assert_allclose(TACs, expected, rtol=1e-2, atol=1e-9)
+    # Doses are given before the output at their time, and the swept second dose only changes later outputs
+    assert TACs[0, 2, 0] > TACs[0, 1, 0]
+    np.testing.assert_array_equal(TACs[0, :2], TACs[1, :2])
+    assert TACs[1, 2, 0] > TACs[0, 2, 0]
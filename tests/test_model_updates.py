@@ -0,0 +1,38 @@
+import libsbml
+import numpy as np
+
+
+def test_overrides_are_restored_between_points(model, dose, simulate_kwargs):
+    _, unswept = model.simulate(dose, **simulate_kwargs)
+    model.simulate(dose, swept_parameters=["Tumor1"], swept_values=[[0.1]], **simulate_kwargs)
+    _, again = model.simulate(dose, **simulate_kwargs)
+    np.testing.assert_array_equal(unswept, again)
+
+
+def test_removed_values_are_restored_from_the_file(model):
+    k_off = dict(model.get_parameters())["k_off"]
+    model.parameters = {"k_off": 2 * k_off, "PS_Tumor1": 0.012}
+    assert model.get_overrides()[model.index.parameter_ids["k_off"]] == 2 * k_off
+
+    model.parameters = {"PS_Tumor1": 0.012}
+    assert dict(model.get_parameters())["k_off"] == k_off
+    assert list(model.get_overrides()) == [model.index.parameter_ids["PS_Tumor1"]]
+
+
+def test_given_values_replace_initial_assignments(model, tmp_path):
+    symbol = model.index.parameter_ids["PS_Tumor1"]
+    model.parameters = {"PS_Tumor1": 0.012}
+    model.save_sbml(str(tmp_path / "given.sbml"))
+    assert libsbml.readSBMLFromFile(str(tmp_path / "given.sbml")).getModel().getInitialAssignment(symbol) is None
+
+    model.parameters = None
+    model.save_sbml(str(tmp_path / "restored.sbml"))
+    assert libsbml.readSBMLFromFile(str(tmp_path / "restored.sbml")).getModel().getInitialAssignment(symbol)
+
+
+def test_backends_agree_on_given_values(model, dose, simulate_kwargs, jax_model):
+    model.parameters = {"PS_Tumor1": 0.012, "kPS_Tumor1": 2 * dict(model.get_parameters())["kPS_Tumor1"]}
+    model.compartment_volumes = {"Tumor1": 0.1}
+    _, expected = model.simulate(dose, **simulate_kwargs)
+    _, TACs = model.simulate(dose, backend="jax", **simulate_kwargs)
+    np.testing.assert_allclose(TACs, expected, rtol=1e-2, atol=1e-6 * np.abs(expected).max())
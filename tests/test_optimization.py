@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from pycno.modeling.optimization import ScheduleSpace, cross_entropy_search, rank_candidates
+
+
+@pytest.fixture
+def model(make_model):
+    return make_model()
+
+
+def test_schedule_space_decodes_increasing_dose_times():
+    space = ScheduleSpace(3, "Blood.Hot", "Blood.Cold", (0.0, 10.0), (0.0, 100.0), (60.0, 120.0))
+    values = space.decode(np.random.default_rng(0).random((50, len(space))))
+
+    assert space.names == ["Blood.Hot[0]", "Blood.Hot[1]", "Blood.Hot[2]", "Blood.Cold[0]", "Blood.Cold[1]",
+                           "Blood.Cold[2]", "times[1]", "times[2]"]
+    assert ((values[:, :3] >= 0) & (values[:, :3] <= 10)).all()
+    for row in values:
+        times, targets = space.get_schedule(row)
+        assert times[0] == 0.0
+        assert ((np.diff(times) >= 60) & (np.diff(times) <= 120)).all()
+        assert targets == {"Blood.Hot": list(row[:3]), "Blood.Cold": list(row[3:6])}
+
+
+def test_rank_candidates_puts_feasible_candidates_first():
+    objective = np.array([5.0, 9.0, np.nan, 7.0, 1.0])
+    violation = np.array([0.0, 0.5, 0.0, 0.0, 0.1])
+    assert list(rank_candidates(objective, violation)) == [3, 0, 2, 4, 1]
+
+
+def test_cross_entropy_search_finds_the_constrained_maximum():
+    def evaluate(u):
+        return u.sum(axis=1), np.maximum(u[:, 0] - 0.3, 0)
+
+    u, objective, violation, evaluations, history = cross_entropy_search(evaluate, 2, population=32,
+                                                                         generations=30, seed=0)
+
+    assert violation == 0
+    np.testing.assert_allclose(u, [0.3, 1.0], atol=0.02)
+    assert evaluations == 32 * len(history)
+    assert (np.diff(history[np.isfinite(history)]) >= 0).all()
+
+
+def test_optimize_schedule_respects_limits(model):
+    limit = 2000.0
+    kwargs = dict(hot_target="Blood.Hot", cold_target=None, hot_bounds=(0.0, 2.0),
+                  interval_bounds=(60.0, 600.0), follow_up=1440.0, population=8, generations=3, seed=0,
+                  executor="serial")
+
+    results = model.optimize_schedule(["Tumor1"], {"Blood": limit}, cycles=(1, 2), max_total_hot=3.0, **kwargs)
+
+    assert sorted(result.n_cycles for result in results) == [1, 2]
+    for result in results:
+        assert result.feasible
+        assert result.outputs["Blood"] <= limit
+        assert sum(result.dose.targets["Blood.Hot"]) <= 3.0
+        assert result.objective == pytest.approx(result.outputs["Tumor1"])
+        assert len(result.dose.times) == result.n_cycles
+    assert results[0].objective >= results[1].objective
+
+    with pytest.raises(ValueError, match="only optimizes single cycle"):
+        model.optimize_schedule(["Tumor1"], {"Blood": limit}, cycles=(1, 2), backend="jax", **kwargs)
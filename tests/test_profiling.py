@@ -0,0 +1,43 @@
+import numpy as np
+
+from pycno.modeling.profiling import PointProfile
+
+
+def test_profile_records_each_point_of_one_integration(model, dose, simulate_kwargs):
+    k_off = dict(model.get_parameters())["k_off"]
+    points = [[k_off], [2 * k_off], [4 * k_off]]
+    seen = []
+
+    _, expected = model.simulate(dose, swept_parameters=["k_off"], swept_values=points, **simulate_kwargs)
+    _, TACs = model.simulate(dose, swept_parameters=["k_off"], swept_values=points, profile=seen.append,
+                             **simulate_kwargs)
+
+    np.testing.assert_array_equal(TACs, expected)
+    assert seen == model.profile.points
+    assert sorted(point.index for point in seen) == [0, 1, 2]
+    for point in seen:
+        assert not point.failed
+        assert {"set_values", "integrate", "project"} <= set(point.phases)
+    assert "points.count_steps" not in model.profile.summary()
+
+    frame = model.profile.to_frame()
+    assert sorted(frame.index) == [0, 1, 2]
+    assert {"integrate", "failed", "error", "worker"} <= set(frame.columns)
+
+
+def test_profile_records_failures_instead_of_raising(model, dose, simulate_kwargs):
+    simulate_kwargs["maximum_integrator_steps"] = 1
+
+    _, TACs = model.simulate(dose, profile=True, **simulate_kwargs)
+
+    assert np.isnan(TACs).all()
+    [failure] = model.profile.failures
+    assert failure.step_limit_reached
+    assert "integrate" in failure.phases
+
+
+def test_step_limit_reached_reads_backend_errors():
+    assert PointProfile(failed=True, error="CVODE Error: CV_TOO_MUCH_WORK").step_limit_reached
+    assert PointProfile(failed=True, error="diffrax: max_steps reached").step_limit_reached
+    assert not PointProfile(failed=True, error="Non-finite result").step_limit_reached
+    assert not PointProfile().step_limit_reached
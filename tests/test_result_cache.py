@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from pycno import Model
+from pycno.utils.cache import ResultCache, set_result_cache
+
+
+@pytest.fixture
+def values(model):
+    k_off = dict(model.get_parameters())["k_off"]
+    return np.array([[0.5], [1.0], [1.5], [2.0]]) * k_off
+
+
+def test_result_cache_merges_hits_and_misses_in_order(model, dose, simulate_kwargs, values, monkeypatch):
+    _, expected = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, **simulate_kwargs)
+
+    set_result_cache(ResultCache(max_size=0))
+    computed = []
+    compute_points = Model.compute_points
+
+    def record(self, spec, backend, targets, points, indices, *args, **kwargs):
+        computed.append(list(indices))
+        return compute_points(self, spec, backend, targets, points, indices, *args, **kwargs)
+
+    monkeypatch.setattr(Model, "compute_points", record)
+
+    model.simulate(dose, swept_parameters=["k_off"], swept_values=values[[1, 3]], **simulate_kwargs)
+    _, cached = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, **simulate_kwargs)
+
+    assert computed == [[0, 1], [0, 2]]
+    np.testing.assert_array_equal(cached, expected)
+
+    _, hits = model.simulate(dose, swept_parameters=["k_off"], swept_values=values[::-1], **simulate_kwargs)
+    assert len(computed) == 2
+    np.testing.assert_array_equal(hits, expected[::-1])
+
+
+def test_result_cache_misses_when_the_model_changes(model, dose, simulate_kwargs, values, monkeypatch):
+    set_result_cache(ResultCache(max_size=0))
+    _, cached = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, **simulate_kwargs)
+    model.parameters = {"kPS_Tumor1": 2 * dict(model.get_parameters())["kPS_Tumor1"]}
+    _, changed = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, **simulate_kwargs)
+    assert not np.allclose(changed[..., 0], cached[..., 0])
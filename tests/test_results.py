@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from pycno import Cohort
+from pycno.modeling.results import SimulationResult
+
+
+def test_simulate_cohort_attaches_patients_to_results(model, dose, simulate_kwargs):
+    k_off = dict(model.get_parameters())["k_off"]
+    cohort = Cohort({"k_off": stats.uniform(0.5 * k_off, k_off)}, 3, seed=0)
+
+    time, TACs, patients = model.simulate_cohort(cohort, dose, **simulate_kwargs)
+    result = model.simulate_cohort(cohort, dose, as_result=True, **simulate_kwargs)
+
+    assert isinstance(result, SimulationResult)
+    np.testing.assert_array_equal(result.time, time)
+    np.testing.assert_array_equal(result.TACs, TACs)
+    assert result.patients.equals(patients)
+    np.testing.assert_array_equal(result.patients["k_off"], cohort[:][:, 0])
+
+
+def test_result_labels_the_arrays_of_simulate(model, dose, simulate_kwargs):
+    time, TACs, cold, PARAMS = model.simulate(dose, return_cold=True, output_parameters=["k_off"],
+                                              **simulate_kwargs)
+    result = model.simulate(dose, return_cold=True, output_parameters=["k_off"], as_result=True,
+                            **simulate_kwargs)
+
+    assert result.regions == ["Tumor1", "Kidney"]
+    np.testing.assert_array_equal(result.get("Kidney"), TACs[:, :, 1])
+    np.testing.assert_array_equal(result.get("Kidney", "cold"), cold[:, :, 1])
+    np.testing.assert_array_equal(result.PARAMS, PARAMS)
+    assert (result.cold[:, -1] > 0).all()
+    assert result.nbytes == TACs.nbytes + cold.nbytes + PARAMS.nbytes
+
+    frame = result.to_frame("cold")
+    assert frame.index.names == ["point", "time"]
+    assert list(frame.columns) == result.regions
+    np.testing.assert_array_equal(frame.loc[0].to_numpy(), cold[0])
+    assert list(result.to_frame("parameters").columns) == result.parameters
+
+
+def test_result_without_cold_raises_for_cold_species(model, dose, simulate_kwargs):
+    result = model.simulate(dose, as_result=True, **simulate_kwargs)
+
+    assert result.cold is None
+    with pytest.raises(ValueError, match="return_cold=True"):
+        result.get("Tumor1", "cold")
+    with pytest.raises(ValueError, match="Unknown species"):
+        result.to_frame("warm")
+
+
+def test_float32_results_halve_memory(model, dose, simulate_kwargs):
+    result = model.simulate(dose, return_cold=True, as_result=True, **simulate_kwargs)
+    compact = model.simulate(dose, return_cold=True, as_result=True, dtype=np.float32, **simulate_kwargs)
+
+    assert compact.TACs.dtype == compact.cold.dtype == np.float32
+    assert compact.nbytes * 2 == result.nbytes
+    np.testing.assert_allclose(compact.TACs, result.TACs, rtol=1e-6)
+    np.testing.assert_allclose(compact.cold, result.cold, rtol=1e-6)
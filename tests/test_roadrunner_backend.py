@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from pycno import Model
+
+
+@pytest.mark.parametrize("name, kind, values", [
+    ("k_off", "parameters", None),
+    ("kPS_Tumor1", "parameters", None),
+    ("Rden_Kidney", "parameters", None),
+    ("Tumor1", "compartment_volumes", None),
+    ("Kidney", "compartment_volumes", None),
+    # Defined by an initial assignment, 0.006 at baseline
+    ("PS_Tumor1", "parameters", [0.012, 0.003]),
+])
+def test_set_values_matches_recompiled_model(model, dose, simulate_kwargs, tmp_path, name, kind, values):
+    """Swept values, and the initial assignments depending on them, match a model compiled with each value."""
+    if values is None:
+        baseline = dict(model.get_parameters())[name] if kind == "parameters" else \
+            model.index.compartment_sizes[model.index.compartment_ids[name]]
+        values = [2.0 * baseline, 0.5 * baseline, baseline]
+
+    _, swept = model.simulate(dose, swept_parameters=[name], swept_values=[[value] for value in values],
+                              **simulate_kwargs)
+
+    for value, TACs in zip(values, swept):
+        point_model = Model("reduced", **{kind: {name: value}})
+        path = tmp_path / f"{name}-{value}.sbml"
+        point_model.save_sbml(str(path))
+        _, expected = Model(str(path)).simulate(dose, **simulate_kwargs)
+        np.testing.assert_allclose(TACs, expected[0], rtol=1e-10, atol=1e-12)
+
+    assert not np.allclose(swept[0], swept[1])
+
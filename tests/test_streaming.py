@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from pycno import Cohort
+
+
+@pytest.fixture
+def values(model):
+    k_off = dict(model.get_parameters())["k_off"]
+    return np.array([[0.5], [1.0], [1.5], [2.0]]) * k_off
+
+
+def test_stream_resumes_pending_points(model, dose, simulate_kwargs, values, tmp_path):
+    _, expected = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, **simulate_kwargs)
+
+    output_path = tmp_path / "sweep"
+    model.simulate(dose, swept_parameters=["k_off"], swept_values=values, output_path=output_path,
+                   **simulate_kwargs)
+
+    # Interrupt after the first two points, and mark a completed point so a rerun of it shows
+    completed = np.lib.format.open_memmap(output_path / "completed.npy", mode="r+")
+    completed[2:] = False
+    completed.flush()
+    TACs = np.lib.format.open_memmap(output_path / "TACs.npy", mode="r+")
+    TACs[0] = -1.0
+    TACs[2:] = np.nan
+    TACs.flush()
+    del completed, TACs
+
+    _, resumed = model.simulate(dose, swept_parameters=["k_off"], swept_values=values, output_path=output_path,
+                                **simulate_kwargs)
+    assert np.all(resumed[0] == -1.0)
+    np.testing.assert_array_equal(resumed[1:], expected[1:])
+    assert np.load(output_path / "completed.npy").all()
+
+
+def test_stream_rejects_a_different_sweep(model, dose, simulate_kwargs, values, tmp_path):
+    model.simulate(dose, swept_parameters=["k_off"], swept_values=values, output_path=tmp_path, **simulate_kwargs)
+    with pytest.raises(ValueError, match="different simulation"):
+        model.simulate(dose, swept_parameters=["k_off"], swept_values=values * 2, output_path=tmp_path,
+                       **simulate_kwargs)
+
+
+def test_streamed_cohort_matches_in_memory_results(model, dose, simulate_kwargs, tmp_path):
+    k_off = dict(model.get_parameters())["k_off"]
+    cohort = Cohort({"k_off": stats.uniform(0.5 * k_off, k_off)}, 5, seed=0)
+    _, expected = model.simulate(dose, swept_parameters=["k_off"], swept_values=cohort, **simulate_kwargs)
+    _, streamed = model.simulate(dose, swept_parameters=["k_off"], swept_values=cohort, output_path=tmp_path,
+                                 **simulate_kwargs)
+    assert isinstance(streamed, np.memmap) and not streamed.flags.writeable
+    np.testing.assert_array_equal(streamed, expected)